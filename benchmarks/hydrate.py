@@ -0,0 +1,46 @@
+import time
+
+from olo import Model, Field
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+
+class Ben(Model):
+    id = Field(int, primary_key=True)
+    name = Field(str)
+    age = Field(int)
+    key = Field(str)
+    password = Field(str, encrypt=True)
+
+
+def rows_per_sec(func, rows):
+    st = time.time()
+    for row in rows:
+        func(row)
+    return len(rows) / (time.time() - st)
+
+
+def run():
+    n = 200000
+    names = tuple(Ben.__sorted_fields__)
+    row = (1, 'a', 1, 'b', None)
+    rows = [row] * n
+
+    def instantiate(item):
+        # hydration before the row constructor
+        return Ben._olo_instantiate(**dict(zip(names, item)))
+
+    constructor = Ben._olo_get_row_constructor(names)
+
+    print('=' * 80)
+    print('[benchmark hydrate %s rows]' % n)
+    print('[_olo_instantiate] %d rows/sec' % rows_per_sec(instantiate, rows))
+    print('[row constructor] %d rows/sec' % rows_per_sec(constructor, rows))
+    print('=' * 80)
+
+
+if __name__ == '__main__':
+    run()
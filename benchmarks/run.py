@@ -74,6 +74,10 @@ def query():
         for _ in xrange(n):
             OBen.query.filter(age=1).all()
 
+    with timer('%s times olo query tuples' % n):
+        for _ in xrange(n):
+            OBen.query.filter(age=1).tuples().all()
+
     with timer('%s times peewee query' % n):
         for _ in xrange(n):
             list(PBen.select().where(PBen.age == 1))
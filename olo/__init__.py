@@ -6,6 +6,7 @@ from olo.database.postgresql import PostgreSQLDataBase
 from olo.model import Model, ModelMeta
 from olo.field import Field, DbField, UnionField, JSONField
 from olo.ast_api import select, select_
+from olo.context import identity_scope
 
 
 __all__ = [
@@ -20,4 +21,5 @@ __all__ = [
     'JSONField',
     'select',
     'select_',
+    'identity_scope',
 ]
@@ -6,7 +6,6 @@ from olo.libs.compiler.utils import get_globals_and_locals
 from olo.libs.compiler.translators.query_translator import ast2src
 from olo.libs.compiler.translators.query_translator2 import ast2factory
 from olo.libs.decompiling import decompile
-from olo.libs.cache import ic
 
 from olo.errors import GeneratorError
 
@@ -47,7 +46,7 @@ def make_query(args, frame_depth=3):
     gen, globals, locals = get_globals_and_locals(
         args, kwargs=None, frame_depth=frame_depth+1, from_generator=True)
     tree, external_names, cells = decompile(gen)
-    code_key = ic.set(gen.gi_frame.f_code)
+    code_key = id(gen.gi_frame.f_code)
     return QueryFactory(code_key, tree.code, globals, locals, cells)
 
 
@@ -1,17 +1,27 @@
 import sys
+import time
 import random
 import logging
-
-from functools import wraps
-
-from olo.compat import izip, str_types, iteritems
-from olo.events import after_delete, after_insert, after_update, before_update
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import date, datetime
+from functools import cmp_to_key, wraps
+from itertools import chain
+
+from olo.compat import izip, str_types, iteritems, itervalues, xrange
+from olo.events import (after_delete, after_insert, after_insert_multi,
+                        after_update, after_update_multi, before_update,
+                        before_update_multi)
 from olo.expression import UnaryExpression
 from olo.field import BaseField
 from olo.key import StrKey
-from olo.errors import CacheError, ORMError
+from olo.libs.cache import LRUCache
+from olo.errors import CacheError, ExpressionError, ORMError
 from olo.logger import logger
 from olo.session import QuerySession
+from olo.stats import CacheStats
 from olo.utils import missing, friendly_repr
 
 
@@ -55,6 +65,120 @@ def order_by_to_strs(order_by):
     return tuple(res)
 
 
+_IMMUTABLE_TYPES = frozenset((
+    int, float, bool, str, bytes, type(None), date, datetime,
+))
+
+
+def _copy_data(data):
+    if not isinstance(data, dict):
+        return data
+    return {
+        k: v if v.__class__ in _IMMUTABLE_TYPES else deepcopy(v)
+        for k, v in iteritems(data)
+    }
+
+
+class L1Cache(LRUCache):
+    """Process-local cache of `_data` dicts, copied on the way in and out."""
+
+    def __init__(self, size=1000, ttl=1):
+        super(L1Cache, self).__init__(size=size, ttl=ttl)
+
+    def get_multi(self, keys):
+        res = super(L1Cache, self).get_multi(keys)
+        return {k: _copy_data(v) for k, v in iteritems(res)}
+
+    def set_multi(self, mapping):
+        super(L1Cache, self).set_multi(
+            {k: _copy_data(v) for k, v in iteritems(mapping)}
+        )
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight(object):
+    """Collapses concurrent calls for the same key into one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.event.wait(timeout) and not call.failed:
+                return call.result
+            return func()
+        try:
+            call.result = func()
+            return call.result
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def do_multi(self, keys, func, timeout=None):
+        """`do` per key: `func(keys)` returns a {key: value} mapping.
+
+        Keys already in flight are waited on, the others are loaded by this
+        call, so overlapping batches only load each key once.
+        """
+        owned = []
+        waiting = []
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    owned.append((key, call))
+                else:
+                    waiting.append((key, call))
+        res = {}
+        if owned:
+            try:
+                res.update(func([key for key, _ in owned]))
+            except Exception:
+                for _, call in owned:
+                    call.failed = True
+                raise
+            finally:
+                with self._lock:
+                    for key, call in owned:
+                        self._calls.pop(key, None)
+                for key, call in owned:
+                    if key in res:
+                        call.result = res[key]
+                    else:
+                        call.failed = True
+                    call.event.set()
+        rest = []
+        for key, call in waiting:
+            if call.event.wait(timeout) and not call.failed:
+                res[key] = call.result
+            else:
+                rest.append(key)
+        if rest:
+            res.update(func(rest))
+        return res
+
+
+single_flight = SingleFlight()
+cache_stats = CacheStats()
+
+
 class CacheWrapper(object):
     MAX_COUNT = 200
 
@@ -69,10 +193,121 @@ class CacheWrapper(object):
     def _cache_client(self):
         return self._model_class._options.cache_client
 
+    @property
+    def _local_cache(self):
+        return self._model_class._options.local_cache
+
     @property
     def _gen_cache_key(self):
         return self._model_class._gen_cache_key
 
+    def _get_deferred_keys(self):
+        db = self._db
+        if db is None or not db.in_transaction():
+            return ()
+        return db.get_cache_keys(self._model_class._options)
+
+    def _cache_get(self, key):
+        if key in self._get_deferred_keys():
+            return None
+        return self._cache_client.get(key)
+
+    def _cache_get_multi(self, keys, local=True, method=None):
+        deferred = self._get_deferred_keys()
+        if deferred:
+            keys = [k for k in keys if k not in deferred]
+        local_cache = self._local_cache if local else None
+        if local_cache is None:
+            return self._decode_multi(
+                self._cache_client.get_multi(keys), method
+            )
+        mapping = local_cache.get_multi(keys)
+        rest = [k for k in keys if k not in mapping]
+        if rest:
+            res = self._decode_multi(
+                self._cache_client.get_multi(rest), method
+            )
+            if res:
+                local_cache.set_multi(res)
+                mapping.update(res)
+        return mapping
+
+    def _decode_multi(self, mapping, method=None):
+        model_class = self._model_class
+        codec = model_class._options.cache_codec
+        res = {}
+        nbytes = 0
+        for key, value in iteritems(mapping):
+            # values not encoded by the codec are sized by the cache_client
+            if isinstance(value, bytes):
+                nbytes += len(value)
+            value = codec.decode(model_class, value)
+            if value is not None:
+                res[key] = value
+        if method is not None and nbytes:
+            self._record(method, nbytes=nbytes)
+        return res
+
+    def _load(self, key, func):
+        return self._load_multi(
+            [key], lambda keys: {key: func()}
+        )[key]
+
+    def _load_multi(self, keys, func):
+        """Run `func(keys)` for missed keys under stampede protection.
+
+        `func` returns (and caches) the raw cache values of `keys`.
+        """
+        mode = self._model_class._options.cache_stampede_protection
+        if not mode or not keys or self._db.in_transaction():
+            return func(keys)
+        if mode == 'lease':
+            return self._load_multi_with_lease(keys, func)
+        return single_flight.do_multi(
+            keys, func, timeout=self._model_class._options.cache_lease_wait
+        )
+
+    def _load_multi_with_lease(self, keys, func):
+        options = self._model_class._options
+        cache_client = self._cache_client
+        leased = []
+        waiting = []
+        for key in keys:
+            lease_key = '{}:lease'.format(key)
+            if cache_client.add(lease_key, 1, options.cache_lease_timeout):
+                leased.append(key)
+            else:
+                waiting.append(key)
+        res = {}
+        try:
+            if leased:
+                res.update(func(leased))
+        finally:
+            if leased:
+                cache_client.delete_multi(
+                    ['{}:lease'.format(k) for k in leased]
+                )
+        deadline = time.time() + options.cache_lease_wait
+        while waiting and time.time() < deadline:
+            time.sleep(options.cache_lease_poll)
+            # the waited keys may be ids or count keys, keep them out of L1
+            mapping = self._cache_get_multi(waiting, local=False)
+            res.update(mapping)
+            waiting = [k for k in waiting if k not in mapping]
+        if waiting:
+            res.update(func(waiting))
+        return res
+
+    def _cache_set_multi(self, mapping):
+        model_class = self._model_class
+        codec = model_class._options.cache_codec
+        self._cache_client.set_multi({
+            key: codec.encode(model_class, value)
+            for key, value in iteritems(mapping)
+        })
+        if self._local_cache is not None:
+            self._local_cache.set_multi(mapping)
+
     def _build_report_miss_msg(self, method_name, *args, **kwargs):
         return 'Miss cache method invocation: `{}.{}({})`'.format(
             self._model_class.__name__, method_name,
@@ -97,30 +332,68 @@ class CacheWrapper(object):
         )
         self._model_class._options.report(msg, level=level)  # noqa pragma: no cover
 
+    def _record(self, method, hits=0, misses=0, fallback=None, nbytes=0):
+        cache_stats.record(
+            self._model_class, method,
+            hits=hits, misses=misses, fallback=fallback, nbytes=nbytes
+        )
+
     def get(self, id=None, **kwargs):
         if not kwargs:
             if not self._cache_client:
+                self._record('get', fallback='no_cache_client')
                 return self._model_class._get(id)
-            values = self.get_multi([id], filter_none=False)
+            values = self._get_multi([id], False, 'get')
             return values[0]
         return self.get_by(**kwargs)
 
     def get_multi(self, idents, filter_none=True):
-        def fallback():
+        return self._get_multi(idents, filter_none, 'get_multi')
+
+    def _get_multi(self, idents, filter_none, method):
+        res = self._model_class._olo_identity_get_multi(
+            idents, filter_none,
+            lambda idents, filter_none: self._get_multi(
+                idents, filter_none, method
+            )
+        )
+        if res is not None:
+            return res
+
+        def fallback(reason):
+            self._record(method, fallback=reason)
             self._report_miss('get_multi', idents, filter_none=filter_none)
             return self._model_class._get_multi(
                 idents, filter_none=filter_none
             )
 
         if not self._cache_client:
-            return fallback()
+            return fallback('no_cache_client')
+
+        keys = self._gen_ident_keys(idents)
+        mapping = self._cache_get_multi(keys, method=method)
+        miss_mapping = self._get_miss_mapping(idents, keys, mapping)
+        self._record(
+            method,
+            hits=len(set(keys)) - len(miss_mapping),
+            misses=len(miss_mapping)
+        )
+
+        def load(keys):
+            new_mapping = self._load_idents(miss_mapping, keys)
+            if new_mapping:
+                self._cache_set_multi(new_mapping)
+            return new_mapping
 
+        mapping.update(self._load_multi(list(miss_mapping), load))
+        return self._build_entities(keys, mapping, filter_none)
+
+    def _gen_ident_keys(self, idents):
         pk_name = self._model_class.get_singleness_pk_name()
 
         unique_keys = get_unique_keys(self._model_class)
 
-        # gen_keys
-        keys = []
+        kwargs_list = []
         for ident in idents:
             if not isinstance(ident, dict):
                 kwargs = {
@@ -135,42 +408,33 @@ class CacheWrapper(object):
                         )
                     )
                 kwargs = ident
-            # pylint: disable=E1102
-            key = self._gen_cache_key(**kwargs)
-            # pylint: enable=E1102
-            keys.append(key)
-
-        key_mapping = dict(izip(map(str, idents), keys))
-        mapping = self._cache_client.get_multi(keys)
-
-        new_idents = []
-        for ident in idents:
-            key = key_mapping.get(str(ident))
-            value = mapping.get(key)
-            if value is None:
-                new_idents.append(ident)
+            kwargs_list.append(kwargs)
+        return self._model_class._gen_cache_keys(kwargs_list)
+
+    @staticmethod
+    def _get_miss_mapping(idents, keys, mapping):
+        return {
+            key: ident for ident, key in izip(idents, keys)
+            if mapping.get(key) is None
+        }
 
+    def _load_idents(self, miss_mapping, keys):
+        new_idents = [miss_mapping[key] for key in keys]
         items = self._model_class._get_multi(new_idents, filter_none=False)
-        new_mapping = {}
-        for item, ident in izip(items, new_idents):
-            key = key_mapping.get(str(ident))
-            if item is None:
-                new_mapping[key] = missing
-            else:
-                new_mapping[key] = mapping[key] = item._data
-
-        if new_mapping:
-            self._cache_client.set_multi(new_mapping)
+        return {
+            key: missing if item is None else item._data
+            for item, key in izip(items, keys)
+        }
 
+    def _build_entities(self, keys, mapping, filter_none):
         session = QuerySession()
         model_class = self._model_class
 
-        for ident in idents:
-            key = key_mapping.get(str(ident))
+        for key in keys:
             item = mapping.get(key)
 
             if isinstance(item, dict):
-                item = model_class._olo_instantiate(_olo_decrypt=False, **item)
+                item = model_class._olo_load(item)
             else:
                 item = None
 
@@ -187,12 +451,15 @@ class CacheWrapper(object):
 
     @wash_kwargs
     def get_by(self, *args, **kwargs):
-        def fallback():
+        def fallback(reason):
+            self._record('get_by', fallback=reason)
             self._report_miss('get_by', *args, **kwargs)
             return self._model_class._get_by(*args, **kwargs)
 
-        if not self._cache_client or args:
-            return fallback()  # pragma: no cover
+        if not self._cache_client:
+            return fallback('no_cache_client')  # pragma: no cover
+        if args:
+            return fallback('expressions')  # pragma: no cover
 
         str_key = get_str_key(kwargs)
         index_keys = get_index_keys(self._model_class)
@@ -204,45 +471,48 @@ class CacheWrapper(object):
                 if _res:
                     return _res[0]
                 return
-            return fallback()
+            return fallback('not_indexed')
 
         # pylint: disable=E1102
         key = self._gen_cache_key(**kwargs)
         # pylint: enable=E1102
-        data = self._cache_client.get(key)
+        data = self._cache_get_multi([key], method='get_by').get(key)
+        self._record('get_by', hits=data is not None, misses=data is None)
         if data is None:
-            res = self._model_class._get_by(**kwargs)
-            if res is None:
-                data = missing
-            else:
-                data = res._data
-            self._cache_client.set(key, data)
-        else:
-            res = (
-                self._model_class._olo_instantiate(_olo_decrypt=False, **data)
-                if isinstance(data, dict) else None
-            )
+            def load():
+                res = self._model_class._get_by(**kwargs)
+                data = missing if res is None else res._data
+                self._cache_set_multi({key: data})
+                return data
+
+            data = self._load(key, load)
+        res = (
+            self._model_class._olo_load(data)
+            if isinstance(data, dict) else None
+        )
         session = QuerySession()
         session.add_entity(res)
         self.add_handler(res)
         return res
 
     @wash_kwargs
-    def get_multi_by(self, *args, **kwargs):
+    def get_multi_by(self, *args, **kwargs):  # pylint: disable=too-many-return-statements
         old_kwargs = dict(kwargs)
 
-        def fallback():
+        def fallback(reason):
+            self._record('get_multi_by', fallback=reason)
             self._report_miss('get_multi_by', *args, **old_kwargs)
             return self._model_class._get_multi_by(*args, **old_kwargs)
 
         if not self._cache_client:
-            return fallback()
+            return fallback('no_cache_client')
 
         unique_keys = get_unique_keys(self._model_class)
 
         start = kwargs.pop('start', 0)
         limit = kwargs.pop('limit', None)
         order_by = kwargs.pop('order_by', None)
+        after = kwargs.pop('after', missing)
         order_by_str = None
         if order_by is not None:
             if isinstance(order_by, list):
@@ -255,6 +525,9 @@ class CacheWrapper(object):
             order_by = None
 
         str_key = get_str_key(kwargs)
+        if after is not missing and (str_key in unique_keys or order_by is None):
+            return fallback('after')
+
         if str_key in unique_keys:
             inst = self.get_by(**kwargs)
             if inst is None:
@@ -262,15 +535,15 @@ class CacheWrapper(object):
             return [inst]
 
         index_keys = get_index_keys(self._model_class)
+        if args:
+            return fallback('expressions')
+        if str_key not in index_keys:
+            return fallback('not_indexed')
         if (
-            args or
-            str_key not in index_keys or
-            (
                 order_by_str and
                 order_by_str not in self._model_class.__order_bys__
-            )
         ):
-            return fallback()
+            return fallback('order_by')
 
         pk_name = self._model_class.get_singleness_pk_name()
 
@@ -284,59 +557,270 @@ class CacheWrapper(object):
         if limit is None:
             limit = sys.maxsize
 
-        over_limit = start + limit > self.MAX_COUNT
-
-        res = self._cache_client.get(key)
+        res = self._cache_get(key)
         logger.debug('[CACHE]: get cache by key: %s, value: %s', key, res)
+        self._record('get_multi_by', hits=res is not None, misses=res is None)
         if res is None:
-            res = self._model_class.get_entities_by(
-                [pk_name],
-                start=0,
-                limit=self.MAX_COUNT + 1,
-                order_by=order_by,
-                **kwargs
-            )
+            def load():
+                res = self._model_class.get_entities_by(
+                    [pk_name],
+                    start=0,
+                    limit=self.MAX_COUNT + 1,
+                    order_by=order_by,
+                    **kwargs
+                )
+                self._cache_client.set(key, res)
+                return res
+
+            res = self._load(key, load)
 
-            self._cache_client.set(key, res)
+        if after is not missing and after is not None:
+            try:
+                start += res.index(self._get_keyset_pk(order_by, after)) + 1
+            except (ValueError, ExpressionError):
+                return fallback('after')
+
+        over_limit = start + limit > self.MAX_COUNT
 
         if len(res) == self.MAX_COUNT + 1 and over_limit:
-            return fallback()
+            res = self._get_segmented_ids(
+                key, res, start + limit, pk_name, order_by, kwargs
+            )
+            if res is None:
+                return fallback('over_limit')
 
         return self.gets(res[start: start + limit])
 
     gets_by = get_multi_by
 
+    def get_multi_by_in(self, attr_name, values, **kwargs):  # pylint: disable=too-many-return-statements
+        """`get_multi_by` with `attr_name IN values`.
+
+        Every value maps to its own cached id list; the lists are fetched
+        with one `get_multi`, misses are filled by one grouped query and
+        the results are merged (and sorted by `order_by`) in process.
+        """
+        old_kwargs = dict(kwargs)
+        model_class = self._model_class
+        # the ids keys and the values in the loaded rows are parsed ones
+        values = list(dict.fromkeys(
+            model_class._parse_attrs({attr_name: v}).get(attr_name, v)
+            for v in values
+        ))
+
+        def fallback(reason):
+            self._record('get_multi_by_in', fallback=reason)
+            self._report_miss(
+                'get_multi_by_in', attr_name, values, **old_kwargs
+            )
+            return model_class._get_multi_by(
+                getattr(model_class, attr_name).in_(values), **old_kwargs
+            )
+
+        if not self._cache_client:
+            return fallback('no_cache_client')
+        if not values:
+            return []
+
+        start = kwargs.pop('start', 0) or 0
+        limit = kwargs.pop('limit', None)
+        order_by = kwargs.pop('order_by', None)
+        if kwargs.pop('after', missing) is not missing:
+            return fallback('after')
+        if limit is None:
+            limit = sys.maxsize
+        order_by_str = None
+        if order_by is not None:
+            if not isinstance(order_by, (list, tuple)):
+                order_by = (order_by,)
+            order_by = tuple(order_by) or None
+            order_by_str = order_by_to_strs(order_by or ())
+
+        str_key = get_str_key(list(kwargs) + [attr_name])
+        if str_key in get_unique_keys(model_class):
+            items = self.gets([dict(kwargs, **{attr_name: v}) for v in values])
+            try:
+                return self._merge_items(items, order_by_str, start, limit)
+            except TypeError:
+                return fallback('order_by')
+        if str_key not in get_index_keys(model_class):
+            return fallback('not_indexed')
+        if order_by_str and order_by_str not in model_class.__order_bys__:
+            return fallback('order_by')
+
+        pk_name = model_class.get_singleness_pk_name()
+        keys = [
+            # pylint: disable=E1102
+            self._gen_cache_key(_olo_suffix='ids', order_by=order_by_str,
+                                **dict(kwargs, **{attr_name: v}))
+            for v in values
+        ]
+        deferred = self._get_deferred_keys()
+        mapping = self._cache_client.get_multi(
+            [k for k in keys if k not in deferred]
+        )
+        miss_values = [
+            v for v, k in izip(values, keys) if mapping.get(k) is None
+        ]
+        self._record(
+            'get_multi_by_in',
+            hits=len(values) - len(miss_values), misses=len(miss_values)
+        )
+        if miss_values:
+            groups = self._load_id_groups(
+                attr_name, miss_values, pk_name, order_by, kwargs
+            )
+            new_mapping = {
+                k: groups[v] for v, k in izip(values, keys) if v in groups
+            }
+            self._cache_client.set_multi(new_mapping)
+            mapping.update(new_mapping)
+
+        end = start + limit
+        id_lists = [mapping[k] for k in keys]
+        if end > self.MAX_COUNT and any(
+                len(ids) > self.MAX_COUNT for ids in id_lists
+        ):
+            return fallback('over_limit')
+        # a row can match several values under a case insensitive collation
+        if not order_by_str:
+            ids = list(dict.fromkeys(chain.from_iterable(id_lists)))
+            return self.gets(ids[start: end])
+        items = self.gets(list(dict.fromkeys(chain.from_iterable(
+            ids[:end] for ids in id_lists
+        ))))
+        try:
+            return self._merge_items(items, order_by_str, start, limit)
+        except TypeError:
+            return fallback('order_by')
+
+    gets_by_in = get_multi_by_in
+
+    def _load_id_groups(self, attr_name, values, pk_name, order_by, kwargs):
+        model_class = self._model_class
+        size = self.MAX_COUNT + 1
+        limit = len(values) * size
+        rows = model_class.get_entities_by(
+            [pk_name, attr_name],
+            getattr(model_class, attr_name).in_(values),
+            order_by=order_by,
+            limit=limit,
+            **kwargs
+        )
+        groups = {v: [] for v in values}
+        # under a case insensitive collation a row may carry a value that
+        # differs from the requested one, only the database knows which
+        # requested values it matched
+        exact = len(set(
+            v.lower() if isinstance(v, str_types) else v for v in values
+        )) == len(values)
+        for pk, value in rows:
+            ids = groups.get(value)
+            if ids is None:
+                exact = False
+            elif len(ids) < size:
+                ids.append(pk)
+        if exact and len(rows) < limit:
+            return groups
+        # a hot value used up the limit, the short lists may be incomplete
+        for v in values:
+            if not exact or len(groups[v]) < size:
+                groups[v] = model_class.get_entities_by(
+                    [pk_name], start=0, limit=size, order_by=order_by,
+                    **dict(kwargs, **{attr_name: v})
+                )
+        return groups
+
+    @staticmethod
+    def _merge_items(items, order_by_str, start, limit):
+        if order_by_str:
+            items = sorted(items, key=cmp_to_key(
+                lambda a, b: _compare(a, b, order_by_str)
+            ))
+        return items[start: start + limit]
+
+    def _get_segmented_ids(self, key, ids, end, pk_name, order_by, kwargs):
+        """Extend the truncated first id list with cached segments.
+
+        Segment k (k >= 1) holds the ids from offset
+        `MAX_COUNT + (k - 1) * cache_ids_segment_size` and one extra id
+        to tell whether more rows follow.
+        """
+        options = self._model_class._options
+        size = options.cache_ids_segment_size
+        if not size:
+            return None
+        count = -(-(end - self.MAX_COUNT) // size)
+        if count > options.cache_ids_max_segments:
+            return None
+        seg_keys = get_ids_segment_keys(key, count)
+        deferred = self._get_deferred_keys()
+        mapping = self._cache_client.get_multi(
+            [k for k in seg_keys if k not in deferred]
+        )
+        ids = ids[:self.MAX_COUNT]
+        for idx, seg_key in enumerate(seg_keys):
+            seg = mapping.get(seg_key)
+            if seg is None:
+                seg = self._load(seg_key, lambda: self._load_segment(
+                    seg_key, self.MAX_COUNT + idx * size, size + 1,
+                    pk_name, order_by, kwargs
+                ))
+            ids.extend(seg[:size])
+            if len(seg) <= size:
+                break
+        return ids
+
+    def _load_segment(self, key, start, limit, pk_name, order_by, kwargs):
+        res = self._model_class.get_entities_by(
+            [pk_name], start=start, limit=limit, order_by=order_by, **kwargs
+        )
+        self._cache_client.set(key, res)
+        return res
+
+    def _get_keyset_pk(self, order_by, after):
+        query = self._model_class.query.order_by(*order_by)
+        keyset_order = query._get_keyset_order()
+        values = query._get_keyset_values(keyset_order, after)
+        pk_name = self._model_class.get_singleness_pk_name()
+        for ob, v in izip(keyset_order, values):
+            if ob.value.attr_name == pk_name:
+                return v
+        return None  # pragma: no cover
+
     @wash_kwargs
     def count_by(self, *expressions, **expression_dict):
         def _get_res():
             return self._model_class._count_by(*expressions, **expression_dict)
 
-        def fallback():
+        def fallback(reason):
+            self._record('count_by', fallback=reason)
             self._report_miss('count_by', *expressions, **expression_dict)
             return _get_res()
 
         if not self._cache_client:
-            return fallback()
+            return fallback('no_cache_client')
 
         str_key = get_str_key(expression_dict)
         unique_keys = get_unique_keys(self._model_class)
         index_keys = get_index_keys(self._model_class)
-        if (
-            expressions or
-            (
-                str_key not in unique_keys and
-                str_key not in index_keys
-            )
-        ):
-            return fallback()
+        if expressions:
+            return fallback('expressions')
+        if str_key not in unique_keys and str_key not in index_keys:
+            return fallback('not_indexed')
 
         # pylint: disable=E1102
         key = self._gen_cache_key(_olo_suffix='count', **expression_dict)
         # pylint: enable=E1102
-        res = self._cache_client.get(key)
+        res = self._cache_get(key)
+        self._record('count_by', hits=res is not None, misses=res is None)
         if res is None:
-            res = _get_res()
-            self._cache_client.set(key, res)
+            def load():
+                res = _get_res()
+                self._cache_client.set(key, res)
+                return res
+
+            res = self._load(key, load)
         return res
 
     def add_handler(self, insts):
@@ -356,6 +840,101 @@ class CacheWrapper(object):
         self._db.add_rollback_handler(_cbk)
 
 
+def get_many(idents_mapping, filter_none=True, max_workers=None):
+    """Fetch several models' rows by ident with one `get_multi` per client.
+
+    `idents_mapping` maps model classes to idents, e.g.
+    `get_many({User: uids, Post: pids})`; the result maps the same classes
+    to their instances. Misses are loaded per model (in a thread pool of
+    `max_workers` when given) and back-filled with one `set_multi`.
+    """
+    res = {}
+    groups = []
+    for model_class, idents in iteritems(idents_mapping):
+        wrapper = model_class.cache
+        if not wrapper._cache_client:
+            res[model_class] = wrapper.get_multi(idents, filter_none)
+            continue
+        idents = list(idents)
+        for group in groups:
+            if group[0] is wrapper._cache_client:
+                group[1].append((wrapper, idents))
+                break
+        else:
+            groups.append((wrapper._cache_client, [(wrapper, idents)]))
+
+    for cache_client, items in groups:
+        res.update(_get_many(cache_client, items, filter_none, max_workers))
+    return res
+
+
+def _get_many(cache_client, items, filter_none, max_workers):
+    plans = []
+    rest = []
+    for wrapper, idents in items:
+        keys = wrapper._gen_ident_keys(idents)
+        local_cache = wrapper._local_cache
+        mapping = {} if local_cache is None else local_cache.get_multi(keys)
+        deferred = wrapper._get_deferred_keys()
+        rest.extend(
+            k for k in keys if k not in mapping and k not in deferred
+        )
+        plans.append((wrapper, idents, keys, mapping))
+
+    values = cache_client.get_multi(rest) if rest else {}
+
+    loads = []
+    for wrapper, idents, keys, mapping in plans:
+        res = wrapper._decode_multi({
+            k: values[k] for k in keys if k in values and k not in mapping
+        }, 'get_many')
+        if res and wrapper._local_cache is not None:
+            wrapper._local_cache.set_multi(res)
+        mapping.update(res)
+        miss_mapping = wrapper._get_miss_mapping(idents, keys, mapping)
+        wrapper._record(
+            'get_many',
+            hits=len(set(keys)) - len(miss_mapping),
+            misses=len(miss_mapping)
+        )
+        if miss_mapping:
+            loads.append((wrapper, mapping, miss_mapping))
+
+    def load(args):
+        wrapper, _, miss_mapping = args
+        return wrapper._load_multi(
+            list(miss_mapping),
+            lambda keys: wrapper._load_idents(miss_mapping, keys)
+        )
+
+    if max_workers and len(loads) > 1 and not any(
+            wrapper._db.in_transaction() for wrapper, _, _ in loads
+    ):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            loaded = list(executor.map(load, loads))
+    else:
+        loaded = [load(args) for args in loads]
+
+    new_values = {}
+    for (wrapper, mapping, _), new_mapping in izip(loads, loaded):
+        mapping.update(new_mapping)
+        model_class = wrapper._model_class
+        codec = model_class._options.cache_codec
+        for key, value in iteritems(new_mapping):
+            new_values[key] = codec.encode(model_class, value)
+        if new_mapping and wrapper._local_cache is not None:
+            wrapper._local_cache.set_multi(new_mapping)
+    if new_values:
+        cache_client.set_multi(new_values)
+
+    return {
+        wrapper._model_class: wrapper._build_entities(
+            keys, mapping, filter_none
+        )
+        for wrapper, _, keys, mapping in plans
+    }
+
+
 def get_str_key(keys):
     return StrKey(
         k.attr_name if not isinstance(k, str_types) else k
@@ -374,85 +953,425 @@ def get_index_keys(cls_or_obj):
     return cls_or_obj.__index_keys__
 
 
-def get_cache_keys(obj):
-    res = []
+class InvalidationPlan(object):
+    """The cache keys a model's writes touch, compiled once per class.
 
-    def _add_count_key(**kwargs):
-        # pylint: disable=E1102
-        res.append(obj._gen_cache_key(_olo_suffix='count', **kwargs))
-        # pylint: enable=E1102
+    `fields` are the attributes used by a unique key, an index key or an
+    order_by; an update only regenerates the keys of the changed ones.
+    """
 
-    unique_keys = get_unique_keys(obj)
-    for key in unique_keys:
-        kwargs = {
-            attr_name: getattr(obj, attr_name)
-            for attr_name in key
+    def __init__(self, model_class):
+        self.unique_keys = [tuple(key) for key in get_unique_keys(model_class)]
+        self.index_keys = [tuple(key) for key in get_index_keys(model_class)]
+        self.order_bys = [None] + list(model_class.__order_bys__)
+        self.order_by_fields = {
+            order_by: frozenset(name.lstrip('-') for name in order_by)
+            for order_by in self.order_bys[1:]
         }
-        _add_count_key(**kwargs)
-        res.append(obj._gen_cache_key(**kwargs))
-    index_keys = get_index_keys(obj)
-    for key in index_keys:
-        kwargs = {
+        self.fields = frozenset(chain(
+            chain.from_iterable(self.unique_keys),
+            chain.from_iterable(self.index_keys),
+            chain.from_iterable(itervalues(self.order_by_fields)),
+        ))
+
+    def get_keys(self, inst):
+        return self._gen_keys(
+            inst, self.unique_keys, self.unique_keys + self.index_keys,
+            [(key, self.order_bys) for key in self.index_keys]
+        )
+
+    def get_update_keys(self, inst, orig, dirty_fields):
+        changed_unique_keys = [
+            key for key in self.unique_keys
+            if not dirty_fields.isdisjoint(key)
+        ]
+        changed_index_keys = []
+        ids_requests = []
+        for key in self.index_keys:
+            if not dirty_fields.isdisjoint(key):
+                changed_index_keys.append(key)
+                ids_requests.append((key, self.order_bys))
+                continue
+            # same list, but sorted by a changed field
+            order_bys = [
+                order_by for order_by in self.order_bys[1:]
+                if not dirty_fields.isdisjoint(self.order_by_fields[order_by])
+            ]
+            if order_bys:
+                ids_requests.append((key, order_bys))
+        count_keys = changed_unique_keys + changed_index_keys
+        return self._gen_keys(
+            inst, self.unique_keys, count_keys, ids_requests
+        ) + self._gen_keys(
+            orig, changed_unique_keys, count_keys,
+            [(key, self.order_bys) for key in changed_index_keys]
+        )
+
+    @staticmethod
+    def _gen_keys(inst, data_keys, count_keys, ids_requests):
+        def get_kwargs(key):
+            return {attr_name: getattr(inst, attr_name) for attr_name in key}
+
+        model_class = inst.__class__
+        return model_class._gen_cache_keys(
+            [get_kwargs(key) for key in data_keys]
+        ) + model_class._gen_cache_keys(
+            [get_kwargs(key) for key in count_keys], _olo_suffix='count'
+        ) + model_class._gen_cache_keys([
+            dict(get_kwargs(key), order_by=order_by)
+            for key, order_bys in ids_requests
+            for order_by in order_bys
+        ], _olo_suffix='ids')
+
+
+def get_cache_keys(obj):
+    return obj._olo_invalidation_plan.get_keys(obj)
+
+
+def get_count_cache_keys(obj):
+    return {
+        # pylint: disable=E1102
+        obj._gen_cache_key(_olo_suffix='count', **{
             attr_name: getattr(obj, attr_name)
             for attr_name in key
-        }
-        _add_count_key(**kwargs)
-        res.append(obj._gen_cache_key(
-            _olo_suffix='ids', order_by=None, **kwargs
-        ))
-        for order_by in obj.__order_bys__:
-            res.append(obj._gen_cache_key(
-                _olo_suffix='ids', order_by=order_by, **kwargs
+        })
+        for key in chain(get_unique_keys(obj), get_index_keys(obj))
+    }
+
+
+def get_delete_cache_keys(sender):
+    orig = sender._orig
+    if not orig or not sender.__primary_key__:
+        return set(get_cache_keys(sender))
+    if sender._olo_get_pk_value() != orig._olo_get_pk_value():
+        return set(get_cache_keys(sender)) | set(get_cache_keys(orig))
+    plan = sender._olo_invalidation_plan
+    dirty_fields = {
+        name for name in plan.fields
+        if getattr(sender, name) != getattr(orig, name)
+    }
+    return set(plan.get_update_keys(sender, orig, dirty_fields))
+
+
+def delete_cache(sender):
+    options = sender._options
+    if not options.cache_client:
+        return
+    keys = get_delete_cache_keys(sender)
+    if keys:
+        _delete_keys(options, list(keys))
+
+
+def get_ids_segment_keys(key, count):
+    return ['{}:seg:{}'.format(key, k) for k in xrange(1, count + 1)]
+
+
+def _get_segment_keys(options, keys):
+    if not options.cache_ids_segment_size:
+        return []
+    res = []
+    for key in keys:
+        if key.endswith(':suffix:ids'):
+            res.extend(get_ids_segment_keys(
+                key, options.cache_ids_max_segments
             ))
     return res
 
 
-def delete_cache(sender):
+def _delete_keys(options, keys):
+    keys = keys + _get_segment_keys(options, keys)
+    db = options.db
+    if db is not None and db.in_transaction():
+        # flushed once by db.commit/db.rollback, see flush_cache_keys
+        db.add_cache_keys(options, keys)
+        return
+    if options.local_cache is not None:
+        options.local_cache.delete_multi(keys)
+    options.cache_client.delete_multi(keys)
+
+
+def flush_cache_keys(mapping):
+    """Apply `{options: {key: value}}` recorded during a transaction.
+
+    None values are deleted with one `delete_multi` per cache client, the
+    others are written through with `set_multi`.
+    """
+    groups = []
+    for options, values in iteritems(mapping):
+        if options.local_cache is not None:
+            options.local_cache.delete_multi(list(values))
+        keys = {k for k, v in iteritems(values) if v is None}
+        if len(keys) < len(values):
+            options.cache_client.set_multi({
+                k: v for k, v in iteritems(values) if v is not None
+            }, options.cache_expire)
+        for cache_client, _keys in groups:
+            if cache_client is options.cache_client:
+                _keys.update(keys)
+                break
+        else:
+            groups.append((options.cache_client, keys))
+    for cache_client, keys in groups:
+        if keys:
+            cache_client.delete_multi(sorted(keys))
+
+
+def _set_values(options, values):
+    db = options.db
+    if db is not None and db.in_transaction():
+        db.add_cache_values(options, values)
+        return
+    if options.local_cache is not None:
+        options.local_cache.delete_multi(list(values))
+    options.cache_client.set_multi(values, options.cache_expire)
+
+
+def get_data_cache_keys(inst):
+    return [
+        # pylint: disable=E1102
+        inst._gen_cache_key(**{
+            attr_name: getattr(inst, attr_name)
+            for attr_name in key
+        })
+        for key in get_unique_keys(inst)
+    ]
+
+
+def delete_multi_cache(sender, insts=()):
     options = sender._options
     if not options.cache_client:
         return
-    keys = set(get_cache_keys(sender))
-    if sender._orig and sender.__primary_key__:
-        dirty_fields = set()
+    keys = set()
+    for inst in insts:
+        keys.update(get_delete_cache_keys(inst))
+    if keys:
+        _delete_keys(options, list(keys))
 
-        for name in sender.__fields__:
-            if getattr(sender, name) != getattr(sender._orig, name):
-                dirty_fields.add(name)
 
-        _keys = set(get_cache_keys(sender._orig))
-        inter_keys = keys.intersection(_keys)
-        keys = keys | _keys
-        if (
-            sender._get_singleness_pk_value() ==
-            sender._orig._get_singleness_pk_value()
-        ):
-            _same_ids_keys = {k for k in inter_keys
-                             if k.endswith(':suffix:ids')}
-            same_ids_keys = set()
-            for key in _same_ids_keys:
-                for name in dirty_fields:
-                    # fix order by modify
-                    if "'{}'".format(name) in key or "'-{}'".format(name) in key:
+def _get_count_deltas(inst, delta):
+    if delta:
+        return {key: delta for key in get_count_cache_keys(inst)}
+    if not inst._orig:
+        return None
+    keys = get_count_cache_keys(inst)
+    orig_keys = get_count_cache_keys(inst._orig)
+    deltas = {key: 1 for key in keys - orig_keys}
+    deltas.update((key, -1) for key in orig_keys - keys)
+    return deltas
+
+
+def _apply_count_deltas(options, deltas):
+    failed = []
+    for key, delta in iteritems(deltas):
+        try:
+            if delta > 0:
+                options.cache_client.incr(key, delta)
+            elif delta < 0:
+                options.cache_client.decr(key, -delta)
+        except Exception:  # pylint: disable=broad-except
+            failed.append(key)
+    if failed:
+        _delete_keys(options, failed)
+
+
+def get_ids_cache_keys(obj):
+    res = {}
+    for key in get_index_keys(obj):
+        kwargs = {
+            attr_name: getattr(obj, attr_name)
+            for attr_name in key
+        }
+        order_bys = list(chain((None,), obj.__order_bys__))
+        keys = obj._gen_cache_keys([
+            dict(kwargs, order_by=order_by) for order_by in order_bys
+        ], _olo_suffix='ids')
+        res.update(izip(keys, order_bys))
+    return res
+
+
+def _get_ids_patches(inst, delta):
+    """Return {ids_key: (order_by, removed_insts, added_insts)}."""
+    res = {}
+    if delta:
+        for key, order_by in iteritems(get_ids_cache_keys(inst)):
+            if delta > 0:
+                res[key] = (order_by, [], [inst])
+            else:
+                res[key] = (order_by, [inst], [])
+        return res
+    if not inst._orig:
+        return None
+    for key, order_by in iteritems(get_ids_cache_keys(inst._orig)):
+        res[key] = (order_by, [inst._orig], [])
+    for key, order_by in iteritems(get_ids_cache_keys(inst)):
+        res.setdefault(key, (order_by, [], []))[2].append(inst)
+    return res
+
+
+def _compare(a, b, order_by):
+    for name in order_by:
+        desc = name.startswith('-')
+        name = name.lstrip('-')
+        x, y = getattr(a, name), getattr(b, name)
+        if x == y:
+            continue
+        if x is None or y is None:
+            raise TypeError('cannot order None')
+        if desc:
+            return 1 if x < y else -1
+        return -1 if x < y else 1
+    return 0
+
+
+def _patch_ids(model_class, key, order_by, removed, added):
+    options = model_class._options
+    cache_client = options.cache_client
+    res = cache_client.gets(key)
+    if res is None:
+        return True
+    ids, cas_unique = res
+    if not isinstance(ids, list):
+        return False
+    pk_name = model_class.get_singleness_pk_name()
+    max_len = options.cache_class.MAX_COUNT + 1
+    drops = {getattr(inst, pk_name) for inst in chain(removed, added)}
+    new_ids = [pk for pk in ids if pk not in drops]
+    if added:
+        items = []
+        if order_by:
+            items = model_class.cache.gets(new_ids, filter_none=False)
+        if any(item is None for item in items):
+            return False
+        for inst in added:
+            pos = len(new_ids)
+            if order_by:
+                for idx, item in enumerate(items):
+                    if _compare(inst, item, order_by) < 0:
+                        pos = idx
                         break
-                else:
-                    same_ids_keys.add(key)
-            keys -= same_ids_keys
+            if len(ids) == max_len and pos == len(new_ids):
+                continue
+            new_ids.insert(pos, getattr(inst, pk_name))
+            if order_by:
+                items.insert(pos, inst)
+    if len(ids) == max_len and len(new_ids) < max_len:
+        return False
+    if new_ids == ids:
+        return True
+    return cache_client.cas(key, new_ids[:max_len], 0, cas_unique)
+
+
+def _apply_ids_patches(model_class, patches):
+    options = model_class._options
+    # the first list is patched in place, later segments are refetched
+    segment_keys = _get_segment_keys(options, list(patches))
+    if segment_keys:
+        options.cache_client.delete_multi(segment_keys)
+    failed = []
+    for key, (order_by, removed, added) in iteritems(patches):
+        try:
+            ok = _patch_ids(model_class, key, order_by, removed, added)
+        except Exception:  # pylint: disable=broad-except
+            ok = False
+        if not ok:
+            failed.append(key)
+    if failed:
+        _delete_keys(model_class._options, failed)
+
+
+def sync_cache(sender, insts, delta):
+    """Invalidate the cache of `insts` after a write.
+
+    `delta` is 1 for inserts, -1 for deletes, 0 for updates and None for
+    the pre-update pass. With `cache_incr_counts` the count keys are
+    adjusted by incr/decr, with `cache_patch_ids` the cached id lists are
+    patched in place and with `cache_write_through` the unique keys of
+    inserted or updated rows are set to their new `_data`; everything else
+    is deleted.
+    """
+    options = sender._options
+    if (
+            not options.cache_incr_counts and
+            not options.cache_patch_ids and
+            not options.cache_write_through
+    ):
+        delete_multi_cache(sender, insts=insts)
+        return
+    if not options.cache_client:
+        return
+    model_class = sender if isinstance(sender, type) else sender.__class__
+    write_through = options.cache_write_through and delta in (0, 1)
+    keys = set()
+    deltas = {}
+    patches = {}
+    values = {}
+    for inst in insts:
+        inst_keys = get_delete_cache_keys(inst)
+        if write_through:
+            value = options.cache_codec.encode(model_class, inst._data)
+            for key in get_data_cache_keys(inst):
+                inst_keys.discard(key)
+                values[key] = value
+        if options.cache_incr_counts:
+            inst_deltas = (
+                {} if delta is None else _get_count_deltas(inst, delta)
+            )
+            if inst_deltas is not None:
+                inst_keys = {k for k in inst_keys
+                             if not k.endswith(':suffix:count')}
+                for key, v in iteritems(inst_deltas):
+                    deltas[key] = deltas.get(key, 0) + v
+        if options.cache_patch_ids:
+            inst_patches = (
+                {} if delta is None else _get_ids_patches(inst, delta)
+            )
+            if inst_patches is not None:
+                ids_keys = {k for k in inst_keys
+                            if k.endswith(':suffix:ids')}
+                inst_keys -= ids_keys
+                for key in ids_keys & set(inst_patches):
+                    order_by, removed, added = inst_patches[key]
+                    patch = patches.setdefault(key, (order_by, [], []))
+                    patch[1].extend(removed)
+                    patch[2].extend(added)
+        keys.update(inst_keys)
+    keys -= set(values)
     if keys:
-        options.cache_client.delete_multi(list(keys))
+        _delete_keys(options, list(keys))
+    if values:
+        _set_values(options, values)
+    if deltas:
+        _apply_count_deltas(options, deltas)
+    if patches:
+        _apply_ids_patches(model_class, patches)
 
 
 def create_cache(sender):
     options = sender._options
     if not options.cache_client:
         return
-    keys = get_cache_keys(sender)
-    if keys:
-        mapping = {key: sender for key in keys}
-        options.cache_client.set_multi(mapping,
-                                       options.cache_expire)
+    model_class = sender.__class__
+    value = options.cache_codec.encode(model_class, sender._data)
+    keys = get_data_cache_keys(sender)
+    if options.local_cache is not None:
+        options.local_cache.delete_multi(keys)
+    options.cache_client.set_multi(
+        {key: value for key in keys}, options.cache_expire
+    )
+
+
+def _make_handler(delta):
+    def handler(sender, insts=None):
+        sync_cache(
+            sender, [sender] if insts is None else insts, delta
+        )
+    return handler
 
 
-after_delete.connect(delete_cache)
-after_insert.connect(delete_cache)
-after_update.connect(delete_cache)
-before_update.connect(delete_cache)
+after_delete.connect(_make_handler(-1), weak=False)
+after_insert.connect(_make_handler(1), weak=False)
+after_insert_multi.connect(_make_handler(1), weak=False)
+after_update.connect(_make_handler(0), weak=False)
+after_update_multi.connect(_make_handler(0), weak=False)
+before_update.connect(_make_handler(None), weak=False)
+before_update_multi.connect(_make_handler(None), weak=False)
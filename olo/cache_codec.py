@@ -0,0 +1,81 @@
+import pickle
+import zlib
+
+_PLAIN = b'\x01'
+_ZLIB = b'\x02'
+
+
+class CacheCodec(object):
+    """Converts a model's `_data` dict to and from the cached value."""
+
+    def encode(self, model_class, data):
+        raise NotImplementedError
+
+    def decode(self, model_class, value):
+        raise NotImplementedError
+
+
+class DictCacheCodec(CacheCodec):
+    """Stores `_data` as is and leaves serialization to the client."""
+
+    def encode(self, model_class, data):
+        return data
+
+    def decode(self, model_class, value):
+        return value
+
+
+class CompactCacheCodec(CacheCodec):
+    """Positional encoding following `__sorted_fields__`.
+
+    Values carry a hash of the field names, so entries written before a
+    schema change decode to None (a cache miss) instead of wrong data.
+    Payloads larger than `compress_threshold` bytes are zlib compressed.
+    """
+
+    def __init__(self, compress_threshold=512, compress_level=1,
+                 protocol=pickle.HIGHEST_PROTOCOL):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.protocol = protocol
+
+    def get_schema(self, model_class):
+        schema = model_class.__dict__.get('_olo_cache_schema')
+        if schema is None:
+            names = tuple(model_class.__sorted_fields__)
+            schema = (names, zlib.crc32(','.join(names).encode('utf-8')))
+            model_class._olo_cache_schema = schema
+        return schema
+
+    def encode(self, model_class, data):
+        if not isinstance(data, dict):
+            return data
+        names, schema_hash = self.get_schema(model_class)
+        values = tuple(data.get(name) for name in names)
+        absent = tuple(
+            idx for idx, name in enumerate(names) if name not in data
+        )
+        payload = pickle.dumps((schema_hash, values, absent), self.protocol)
+        if (
+                self.compress_threshold is not None and
+                len(payload) > self.compress_threshold
+        ):
+            return _ZLIB + zlib.compress(payload, self.compress_level)
+        return _PLAIN + payload
+
+    def decode(self, model_class, value):
+        if not isinstance(value, bytes):
+            return value
+        flag, payload = value[:1], value[1:]
+        if flag == _ZLIB:
+            payload = zlib.decompress(payload)
+        elif flag != _PLAIN:
+            return None
+        names, schema_hash = self.get_schema(model_class)
+        _schema_hash, values, absent = pickle.loads(payload)
+        if _schema_hash != schema_hash:
+            return None
+        data = dict(zip(names, values))
+        for idx in absent:
+            del data[names[idx]]
+        return data
@@ -8,6 +8,8 @@ from olo.field import Field
 class CachedQuery(Query):
 
     def _can_be_cached(self):  # pylint: disable=too-many-return-statements
+        if self._rows_mode is not None:
+            return False
         if self._having_expression is not None:
             return False
         if self._join_chain:
@@ -19,6 +21,7 @@ class CachedQuery(Query):
             return False
         if self._group_by:
             return False  # pragma: no cover
+        in_count = 0
         exps = [self._expression]
         while exps:
             exp = exps.pop()
@@ -38,7 +41,14 @@ class CachedQuery(Query):
                 continue
 
             if isinstance(exp.left, Field):
-                if exp.operator not in (
+                if exp.operator == 'IN':
+                    in_count += 1
+                    if (
+                            in_count > 1 or
+                            not isinstance(exp.right, (list, tuple, set))
+                    ):
+                        return False
+                elif exp.operator not in (
                         '=', 'is'
                 ):
                     return False
@@ -49,6 +59,20 @@ class CachedQuery(Query):
             return False
         return True
 
+    def _get_in_attr_name(self):
+        exps = [self._expression]
+        while exps:
+            exp = exps.pop()
+            if exp is None:
+                continue
+            if isinstance(exp.left, BinaryExpression):
+                exps.append(exp.left)
+                exps.append(exp.right)
+                continue
+            if exp.operator == 'IN':
+                return exp.left.attr_name
+        return None
+
     def first(self):
         res = self.limit(1).all()
         return res[0] if res else None
@@ -79,15 +103,30 @@ class CachedQuery(Query):
         fallback = lambda: super(CachedQuery, self).all()  # noqa
         if not self._can_be_cached():
             return fallback()  # pragma: no cover
+        expression_dict = self._get_expression_dict()
+        in_attr_name = self._get_in_attr_name()
+        if in_attr_name is not None:
+            return self._model_class.cache.gets_by_in(
+                in_attr_name, expression_dict.pop(in_attr_name),
+                order_by=self._order_by,
+                start=self._offset,
+                limit=self._limit,
+                after=self._after,
+                **expression_dict
+            )
         return self._model_class.cache.gets_by(
             order_by=self._order_by,
             start=self._offset,
             limit=self._limit,
-            **self._get_expression_dict()
+            after=self._after,
+            **expression_dict
         )
 
     def count(self):
-        if not self._can_be_cached():
+        if (
+                not self._can_be_cached() or
+                self._get_in_attr_name() is not None
+        ):
             return super(CachedQuery, self).count()  # pragma: no cover
         return self._model_class.cache.count_by(
             **self._get_expression_dict()
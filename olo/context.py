@@ -12,6 +12,7 @@ class Context(object):
     instantiate_depth: Optional[int]
     table_alias_mapping: Optional[Dict[str, str]]
     in_sql_translation: Optional[bool]
+    identity_map: Optional[Dict[tuple, object]]
 
     @property
     def local(self):
@@ -73,3 +74,29 @@ def in_sql_translation_context():
     finally:
         context.in_sql_translation = _in_sql_translation
 
+
+def identity_key(inst):
+    # keyed by class: models sharing a table must not get each other's rows
+    return (inst.__class__,) + inst._olo_get_pk_value()
+
+
+def identify(inst):
+    identity_map = context.identity_map
+    if identity_map is None or inst is None:
+        return inst
+    return identity_map.setdefault(identity_key(inst), inst)
+
+
+@contextmanager
+def identity_scope():
+    """Share loaded instances by `(model class, *pk)` inside the block.
+
+    Nested scopes reuse the outermost identity map.
+    """
+    _identity_map = context.identity_map
+    try:
+        if _identity_map is None:
+            context.identity_map = {}
+        yield context.identity_map
+    finally:
+        context.identity_map = _identity_map
@@ -4,6 +4,7 @@ from __future__ import annotations
 import json
 import logging
 import re
+import time
 from datetime import datetime, date
 from functools import wraps
 from queue import Queue, Empty
@@ -94,7 +95,16 @@ class OLOCursor(object):
 
         if isinstance(self.db, DataBase):
             kwargs['called_from_store'] = kwargs.pop('called_from_store', True)  # noqa pragma: no cover
-        r = self.cur.execute(sql, *args, **kwargs)
+        stats = self.db.statement_stats
+        if stats is None:
+            r = self.cur.execute(sql, *args, **kwargs)
+        else:
+            st = time.time()
+            r = self.cur.execute(sql, *args, **kwargs)
+            stats.record(
+                sql, time.time() - st,
+                rows=getattr(self.cur, 'rowcount', None)
+            )
         params = args[0] if args else None
         if self.db.enable_log:
             self.log(sql, params)
@@ -109,6 +119,9 @@ class OLOCursor(object):
     def get_last_rowid(self):
         raise NotImplementedError
 
+    def get_last_rowids(self, count):
+        raise NotImplementedError
+
 
 def get_sqls(lines):
     sql = ''
@@ -144,6 +157,7 @@ class BaseDataBase(object):
         self._tables = None
         self._index_rows_mapping = {}
         self.enable_log = False
+        self.statement_stats = None
         self._models: List[Model] = []
         self.modified_cursors = ThreadedObject(Queue)
 
@@ -192,6 +206,31 @@ class BaseDataBase(object):
             except Exception:  # pragma: no cover
                 self.report()  # pragma: no cover
 
+    def add_cache_keys(self, options, keys):
+        self._local.add_cache_keys(options, keys)
+
+    def add_cache_values(self, options, mapping):
+        self._local.add_cache_values(options, mapping)
+
+    def get_cache_keys(self, options):
+        return self._local._cache_keys.get(options, ())
+
+    def _flush_cache_keys(self, rollback=False):
+        cache_keys = self._local.pop_cache_keys()
+        if not cache_keys:
+            return
+        if rollback:
+            # never write through values of a rolled back transaction
+            cache_keys = {
+                options: dict.fromkeys(values)
+                for options, values in cache_keys.items()
+            }
+        from olo.cache import flush_cache_keys
+        try:
+            flush_cache_keys(cache_keys)
+        except Exception:
+            self.report()
+
     def get_tables(self):
         if self._tables is None:
             try:
@@ -404,7 +443,11 @@ class BaseDataBase(object):
     def get_cursor(self) -> OLOCursor:
         raise NotImplementedError
 
-    def sql_execute(self, sql, params=None, **kwargs):  # pylint: disable=W
+    def get_stream_cursor(self) -> OLOCursor:
+        # on its own connection: the open transaction is invisible to it
+        raise NotImplementedError
+
+    def sql_execute(self, sql, params=None, insert_rows=None, **kwargs):  # pylint: disable=W
         cmd = None
         try:
             cmd, _ = parse_execute_sql(sql)
@@ -420,6 +463,8 @@ class BaseDataBase(object):
                 not kwargs.get('executemany') and
                 cmd == 'insert'
         ):
+            if insert_rows is not None:
+                return cur.get_last_rowids(insert_rows)
             last_rowid = cur.get_last_rowid()
             if last_rowid:
                 return last_rowid
@@ -465,12 +510,12 @@ class BaseDataBase(object):
         if first_err is not None:
             raise first_err  # pragma: no cover pylint: disable=E
 
-    def ast_execute(self, sql_ast):
+    def ast_execute(self, sql_ast, **kwargs):
         sql, params = self.ast_translator.translate(sql_ast)
-        return self.execute(sql, params=params)
+        return self.execute(sql, params=params, **kwargs)
 
-    def execute(self, sql, params=None):
-        return self.sql_execute(sql, params)
+    def execute(self, sql, params=None, **kwargs):
+        return self.sql_execute(sql, params, **kwargs)
 
     def commit_beansdb(self):
         self._do_beansdb_commands()
@@ -480,6 +525,7 @@ class BaseDataBase(object):
         self.commit_beansdb()
         self._run_lazy_funcs()
         self._run_commit_handlers()
+        self._flush_cache_keys()
         return res
 
     def rollback(self):
@@ -487,6 +533,7 @@ class BaseDataBase(object):
         self._local.pop_beansdb_transaction()
         self._local.clear_lazy_funcs()
         self._run_rollback_handlers()
+        self._flush_cache_keys(rollback=True)
         return res
 
     def push_transaction(self, transaction):
@@ -564,6 +611,18 @@ class MySQLCursor(OLOCursor):
     def get_last_rowid(self):
         return self.lastrowid
 
+    def get_last_rowids(self, count):
+        # LAST_INSERT_ID() is the id of the first row of a multi-row insert,
+        # the next ones follow `auto_increment_increment` apart
+        first_rowid = self.lastrowid
+        if not first_rowid:
+            return []
+        step = 1
+        if count > 1:
+            self.cur.execute('SELECT @@auto_increment_increment')
+            step = int(self.cur.fetchone()[0])
+        return list(range(first_rowid, first_rowid + count * step, step))
+
     def log(self, sql, params=None, level=logging.INFO):
         db = self._get_db()
         literal = sql_literal_factory(db)
@@ -577,6 +636,24 @@ class MySQLCursor(OLOCursor):
         logger.log(msg=msg, level=level)
 
 
+class StreamCursorMixin(object):
+    # stream cursors own a dedicated connection, give it back on close
+    def close(self):
+        if getattr(self, '_closed', False):
+            return
+        self._closed = True
+        conn = self.cur.conn
+        try:
+            self.cur.close()
+            conn.rollback()
+        finally:
+            conn.release()
+
+
+class MySQLStreamCursor(StreamCursorMixin, MySQLCursor):
+    pass
+
+
 class DataBase(BaseDataBase):
     def __init__(self, store, beansdb=None, autocommit=True,
                  report=lambda *args, **kwargs: None):
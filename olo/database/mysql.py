@@ -1,6 +1,6 @@
 from threading import Timer
 
-from olo.database import BaseDataBase, MySQLCursor
+from olo.database import BaseDataBase, MySQLCursor, MySQLStreamCursor
 from olo.libs.class_proxy import ClassProxy
 from olo.libs.pool import Pool, ConnProxy
 
@@ -26,6 +26,14 @@ def create_conn(host, port, user, password, dbname, charset):
     return conn
 
 
+def get_ss_cursor_class():
+    try:
+        from MySQLdb.cursors import SSCursor
+    except ImportError:
+        from pymysql.cursors import SSCursor
+    return SSCursor
+
+
 class MySQLConnProxy(ConnProxy):
     def __init__(self, conn, pool):
         super(MySQLConnProxy, self).__init__(
@@ -40,8 +48,8 @@ class MySQLConnProxy(ConnProxy):
             super(MySQLConnProxy, self).__str__()
         )
 
-    def cursor(self):
-        cur = self.conn.cursor()
+    def cursor(self, *args, **kwargs):
+        cur = self.conn.cursor(*args, **kwargs)
         cur = CursorProxy(cur, self)
         return cur
 
@@ -149,3 +157,10 @@ class MySQLDataBase(BaseDataBase):
 
         cur = conn.cursor()
         return MySQLCursor(cur, self)
+
+    def get_stream_cursor(self):
+        assert self.in_transaction(), 'db.get_stream_cursor must in transaction!'
+
+        conn = self.get_conn()
+        cur = conn.cursor(get_ss_cursor_class())
+        return MySQLStreamCursor(cur, self)
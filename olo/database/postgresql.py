@@ -1,16 +1,19 @@
+import itertools
 import logging
 import re
 from enum import Enum
 from typing import Tuple, Optional, List
 
 from olo.logger import logger
-from olo.database import BaseDataBase, OLOCursor
+from olo.database import BaseDataBase, OLOCursor, StreamCursorMixin
 from olo.database.mysql import MySQLConnProxy
 from olo.libs.pool import Pool
 from olo.sql_ast_translators.postgresql_sql_ast_translator import PostgresSQLSQLASTTranslator
 from olo.sql_ast_translators.sql_ast_translator import AST
 from olo.utils import camel2underscore
 
+_stream_cursor_ids = itertools.count(1)
+
 PATTERN_INDEX_DEF = re.compile('CREATE (?P<unique>UNIQUE )?INDEX (?P<name>.*) ON .* (?P<btree>USING btree )?\\((?P<fields>.*?)\\)')  # noqa
 
 
@@ -28,10 +31,21 @@ class PostgreSQLCursor(OLOCursor):
         except psycopg2.ProgrammingError:
             return
 
+    def get_last_rowids(self, count):
+        import psycopg2
+        try:
+            return [row[0] for row in self.fetchall()]
+        except psycopg2.ProgrammingError:
+            return []
+
     def log(self, sql: str, params: Optional[Tuple] = None, level: int = logging.INFO) -> None:
         logger.log(msg=self.mogrify(sql, params).decode('utf8'), level=level)
 
 
+class PostgreSQLStreamCursor(StreamCursorMixin, PostgreSQLCursor):
+    pass
+
+
 class PostgreSQLConnProxy(MySQLConnProxy):
     def ping(self):
         import psycopg2
@@ -86,6 +100,14 @@ class PostgreSQLDataBase(BaseDataBase):
         cur = conn.cursor()
         return PostgreSQLCursor(cur, self)
 
+    def get_stream_cursor(self):
+        assert self.in_transaction(), 'db.get_stream_cursor must in transaction!'
+
+        conn = self.get_conn()
+        # named cursor is server-side cursor in psycopg2
+        cur = conn.cursor(name='olo_stream_{}'.format(next(_stream_cursor_ids)))
+        return PostgreSQLStreamCursor(cur, self)
+
     def get_tables(self):
         if self._tables is None:
             try:
@@ -4,6 +4,9 @@ from blinker import Namespace
 signal = Namespace().signal
 
 before_update = signal('before_update')
+before_update_multi = signal('before_update_multi')
 after_update = signal('after_update')
+after_update_multi = signal('after_update_multi')
 after_insert = signal('after_insert')
+after_insert_multi = signal('after_insert_multi')
 after_delete = signal('after_delete')
@@ -20,17 +20,17 @@ def unpad(s):
 
 
 def encrypt(plain_text, key):
-    cipher = AES.new(to_bytes(key), MODE)
     if not isinstance(plain_text, str_types + (int,)):
         return plain_text
+    cipher = AES.new(to_bytes(key), MODE)
     encrypted = cipher.encrypt(to_bytes(pad(plain_text)))
     return to_str(base64.b64encode(encrypted))
 
 
 def decrypt(cipher_text, key):
-    cipher = AES.new(to_bytes(key), MODE)
     if not (cipher_text and isinstance(cipher_text, str_types + (int,))):
         return cipher_text
+    cipher = AES.new(to_bytes(key), MODE)
     cipher_text = to_bytes(cipher_text)
     decrypted = base64.b64decode(cipher_text)
     result = unpad(cipher.decrypt(decrypted))
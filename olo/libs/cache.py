@@ -1,53 +1,124 @@
+import threading
+import time
+import weakref
 from collections import OrderedDict
 
 
 class LRUCache(object):
-    def __init__(self, size=5):
-        self.size = size,
-        self.cache = OrderedDict()
-
-    def get(self, key):
-        if key in self.cache:
-            val = self.cache.pop(key)
-            self.cache[key] = val
-        else:
-            val = None
-
-        return val
-
-    def set(self, key, val):
-        if key in self.cache:
-            val = self.cache.pop(key)
-            self.cache[key] = val
-        else:
-            if len(self.cache) == self.size:
-                self.cache.popitem(last=False)
-                self.cache[key] = val
-            else:
-                self.cache[key] = val
-
-
-class LocalCache(object):
-    def __init__(self):
-        self._data = {}
+    """Bounded thread-safe LRU cache with optional TTL (in seconds)."""
 
-    def set(self, key, value):
-        self._data[key] = value
-        return True
+    def __init__(self, size=128, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get(self._make_key(key), time.monotonic()) is not None
+
+    def _make_key(self, key):
+        return key
+
+    def _make_entry(self, key, value, expire_at):
+        return (expire_at, value)
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expire_at = entry[0]
+        if expire_at is not None and expire_at < now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get_multi(self, keys):
+        res = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                _key = self._make_key(key)
+                entry = self._get(_key, now)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(_key)
+                self.hits += 1
+                res[key] = entry[1]
+        return res
 
     def get(self, key, default=None):
-        return self._data.get(key, default)
+        return self.get_multi([key]).get(key, default)
+
+    def set_multi(self, mapping):
+        expire_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in mapping.items():
+                _key = self._make_key(key)
+                self._data[_key] = self._make_entry(key, value, expire_at)
+                self._data.move_to_end(_key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def delete_multi(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(self._make_key(key), None)
 
     def delete(self, key):
-        self._data.pop(key, None)
+        self.delete_multi([key])
 
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
 
-class IDCache(LocalCache):
-    def set(self, value):
-        key = id(value)
-        super(IDCache, self).set(key, value)
-        return key
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'max_size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class WeakKeyLRUCache(LRUCache):
+    """LRUCache keyed by object identity without keeping the keys alive.
+
+    Suitable for code objects: entries go away with their key object and
+    a recycled `id()` never hits a stale entry.
+    """
+
+    def _make_key(self, key):
+        return id(key)
+
+    def _make_entry(self, key, value, expire_at):
+        _key = id(key)
+        _data = self._data
+
+        def remove(ref):
+            entry = _data.get(_key)
+            if entry is not None and entry[2] is ref:
+                _data.pop(_key, None)
+
+        return (expire_at, value, weakref.ref(key, remove))
 
+    def _get(self, key, now):
+        entry = super(WeakKeyLRUCache, self)._get(key, now)
+        if entry is not None and entry[2]() is None:
+            del self._data[key]
+            return None
+        return entry
 
-lc = LocalCache()
-ic = IDCache()
@@ -13,16 +13,12 @@ import types
 from opcode import opname as opnames, HAVE_ARGUMENT, EXTENDED_ARG, cmp_op
 from opcode import hasconst, hasname, hasjrel, haslocal, hascompare, hasfree, hasjabs
 
-from olo.libs.cache import LocalCache
+from olo.libs.cache import WeakKeyLRUCache
 from olo.libs.compiler import ast
 from olo.libs.compiler.utils import throw
 
 
-def get_codeobject_id(obj):
-    return id(obj)
-
-
-ast_cache = LocalCache()
+ast_cache = WeakKeyLRUCache(1024)
 
 
 def decompile(x):
@@ -41,12 +37,11 @@ def decompile(x):
                 cells = dict(izip(codeobject.co_freevars, x.__closure__))
     else:
         throw(TypeError)
-    key = get_codeobject_id(codeobject)
-    result = ast_cache.get(key)
+    result = ast_cache.get(codeobject)
     if result is None:
         decompiler = Decompiler(codeobject)
         result = decompiler.ast, decompiler.external_names
-        ast_cache.set(key, result)
+        ast_cache.set(codeobject, result)
     return result + (cells,)
 
 
@@ -46,6 +46,7 @@ class DbLocal(threading.local):
         self._lazy_funcs = deque()
         self._commit_handlers = deque()
         self._rollback_handlers = deque()
+        self._cache_keys = {}
 
     def start_beansdb_transaction(self):
         self._beansdb_commands.append(deque())
@@ -89,3 +90,14 @@ class DbLocal(threading.local):
 
     def clear_rollback_handlers(self):
         self._rollback_handlers.clear()
+
+    def add_cache_keys(self, options, keys):
+        self._cache_keys.setdefault(options, {}).update(dict.fromkeys(keys))
+
+    def add_cache_values(self, options, mapping):
+        self._cache_keys.setdefault(options, {}).update(mapping)
+
+    def pop_cache_keys(self):
+        cache_keys = self._cache_keys
+        self._cache_keys = {}
+        return cache_keys
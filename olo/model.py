@@ -1,3 +1,4 @@
+import hashlib
 import inspect
 import operator
 import re
@@ -12,18 +13,24 @@ from typing import Tuple, List, Dict, Set, Union, Any, Callable
 from six import with_metaclass
 
 from olo._speedups import decrypt_attrs, parse_attrs
-from olo.cache import CacheWrapper, delete_cache
+from olo.cache import CacheWrapper, InvalidationPlan, L1Cache, delete_cache
+from olo.cache_codec import CompactCacheCodec
 from olo.cached_query import CachedQuery
 from olo.compat import (str_types, iteritems, iterkeys, itervalues, izip,
                         long, reduce, get_values, xrange)
-from olo.context import Context, context, model_instantiate_context
-from olo.errors import DeparseError, ExpressionError, InvalidFieldError, ORMError
-from olo.events import after_delete, after_insert, after_update, before_update
+from olo.context import (Context, context, identify, identity_key,
+                         model_instantiate_context)
+from olo.errors import (DeparseError, ExpressionError, InvalidFieldError,
+                        ORMError, SupportError)
+from olo.events import (after_delete, after_insert, after_insert_multi,
+                        after_update, after_update_multi, before_update,
+                        before_update_multi)
 from olo.expression import Expression
 from olo.ext.exported import IS_EXPORTED_PROPERTY
 from olo.ext.n import N
 from olo.field import BaseField, DbField, Field, UnionField, BatchField
 from olo.funcs import RAND
+from olo.interfaces import SQLASTInterface
 from olo.key import StrKey
 from olo.query import Query
 from olo.statement import Assignment
@@ -71,7 +78,7 @@ class ModelOptions(object):
     def __init__(self, db=None, cache_client=None,
                  cache_key_prefix='olo', cache_expire=60 * 60 * 24,
                  enable_log=False, db_field_version=1,
-                 cache_key_version='v0.1.1',
+                 cache_key_version='v0.2.0',
                  query_class=Query,
                  cached_query_class=CachedQuery,
                  cache_class=CacheWrapper,
@@ -79,6 +86,20 @@ class ModelOptions(object):
                  report=None,
                  table_engine=None,
                  table_charset=None,
+                 compact=False,
+                 local_cache_size=0,
+                 local_cache_ttl=1,
+                 cache_stampede_protection=None,
+                 cache_lease_timeout=3,
+                 cache_lease_wait=0.5,
+                 cache_lease_poll=0.02,
+                 cache_incr_counts=False,
+                 cache_patch_ids=False,
+                 cache_ids_segment_size=None,
+                 cache_ids_max_segments=10,
+                 cache_codec=None,
+                 cache_write_through=False,
+                 cache_key_max_length=None,
                  **kwargs):
         assert db_field_version in (0, 1)
         if db:
@@ -96,6 +117,27 @@ class ModelOptions(object):
         self.auto_use_cache = auto_use_cache
         self.table_engine = table_engine
         self.table_charset = table_charset
+        self.compact = compact
+        self.local_cache_size = local_cache_size
+        self.local_cache_ttl = local_cache_ttl
+        self.local_cache = (
+            L1Cache(local_cache_size, local_cache_ttl)
+            if local_cache_size else None
+        )
+        assert cache_stampede_protection in (None, 'single_flight', 'lease')
+        self.cache_stampede_protection = cache_stampede_protection
+        self.cache_lease_timeout = cache_lease_timeout
+        self.cache_lease_wait = cache_lease_wait
+        self.cache_lease_poll = cache_lease_poll
+        self.cache_incr_counts = cache_incr_counts
+        self.cache_patch_ids = cache_patch_ids
+        self.cache_ids_segment_size = cache_ids_segment_size
+        self.cache_ids_max_segments = cache_ids_max_segments
+        self.cache_codec = (
+            CompactCacheCodec() if cache_codec is None else cache_codec
+        )
+        self.cache_write_through = cache_write_through
+        self.cache_key_max_length = cache_key_max_length
         self._report = report
         self.update(**kwargs)
 
@@ -292,6 +334,50 @@ class ModelIter(object):
     __next__ = next
 
 
+# per instance state of compact models, field values stay in `_data`
+_COMPACT_SLOTS = (
+    '_data', '_olo_parsed_data', '_olo_dirty_fields', '_orig',
+    '_olo_is_new', '_olo_decrypt', '_olo_qs', '_olo_qs_idx',
+)
+
+
+class _LazySlot(object):
+    def __init__(self, slot, factory):
+        self.slot = slot
+        self.factory = factory
+
+    def __get__(self, obj, objtype):
+        if obj is None:
+            return self  # pragma: no cover
+        v = getattr(obj, self.slot)
+        if v is None:
+            v = self.factory()
+            setattr(obj, self.slot, v)
+        return v
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+def _get_compact_slots(bases, slots):
+    if isinstance(slots, str_types):
+        slots = (slots,)
+    existing = set()
+    has_weakref = False
+    for base in bases:
+        has_weakref = has_weakref or base.__weakrefoffset__ != 0
+        for klass in base.__mro__:
+            klass_slots = klass.__dict__.get('__slots__', ())
+            if isinstance(klass_slots, str_types):
+                klass_slots = (klass_slots,)  # pragma: no cover
+            existing.update(klass_slots)
+    res = list(slots)
+    res.extend(k for k in _COMPACT_SLOTS if k not in existing and k not in res)
+    if not has_weakref and '__weakref__' not in res:
+        res.append('__weakref__')
+    return tuple(res)
+
+
 class ModelMeta(type):
     _finals = set()
 
@@ -334,6 +420,14 @@ class ModelMeta(type):
         if '__abstract__' not in attrs:
             attrs['__abstract__'] = False
 
+        if attrs['_options'].compact:
+            attrs['__slots__'] = _get_compact_slots(
+                bases, attrs.get('__slots__', ())
+            )
+            attrs['_olo_compact'] = True
+            attrs['_parsed_data'] = _LazySlot('_olo_parsed_data', dict)
+            attrs['_dirty_fields'] = _LazySlot('_olo_dirty_fields', set)
+
         return super(ModelMeta, mcs).__new__(mcs, class_name, bases, attrs)
 
     def __init__(cls, class_name, bases, attrs):
@@ -431,6 +525,8 @@ class ModelMeta(type):
             set(_product_order_by_tuples(cls.__primary_key__))
         )
 
+        cls._olo_invalidation_plan = InvalidationPlan(cls)
+
         cls._lock = threading.RLock()
 
         old_init = attrs.get('__init__')
@@ -445,6 +541,8 @@ class ModelMeta(type):
             cls._olo_is_breaked = True
 
         cls.__ctx__ = Context()
+        cls._olo_row_constructors = {}
+        cls._olo_cache_key_templates = {}
 
         if cls._options.db is not None:
             cls._options.db.register_model(cls)
@@ -465,6 +563,51 @@ class ModelMeta(type):
     def __sorted_fields__(cls):
         return sorted(cls.__fields__, key=lambda x: getattr(cls, x).id)
 
+    def _olo_get_row_constructor(cls, attr_names, offset=0):
+        key = (attr_names, offset)
+        constructor = cls._olo_row_constructors.get(key)
+        if constructor is None:
+            constructor = _make_row_constructor(cls, attr_names, offset)
+            cls._olo_row_constructors[key] = constructor
+        return constructor
+
+    def _olo_load(cls, data):
+        # data is already decrypted, e.g. from cache
+        if _needs_instantiate(cls):
+            return identify(
+                cls._olo_instantiate(_olo_decrypt=False, **data)
+            )
+        inst = cls.__new__(cls)  # pylint: disable=no-value-for-parameter
+        inst._olo_is_new = False
+        inst._olo_decrypt = False
+        inst._init()
+        inst._data = dict(data)
+        return identify(inst)
+
+    def _olo_identity_get_multi(cls, idents, filter_none, get_multi):
+        """Serve `idents` from the identity map, loading the rest with
+        `get_multi`; None when nothing is mapped."""
+        identity_map = context.identity_map
+        if not identity_map:
+            return None
+        found = {}
+        for idx, ident in enumerate(idents):
+            if not isinstance(ident, dict):
+                inst = identity_map.get((cls, ident))
+                if inst is not None:
+                    found[idx] = inst
+        if not found:
+            return None
+        rest = [ident for idx, ident in enumerate(idents) if idx not in found]
+        items = iter(get_multi(rest, filter_none=False) if rest else ())
+        res = []
+        for idx in xrange(len(idents)):
+            item = found[idx] if idx in found else next(items)
+            if item is None and filter_none:
+                continue
+            res.append(item)
+        return res
+
     @classmethod
     def final(mcs, method):
         name = getattr(method, '__name__', None)
@@ -476,6 +619,65 @@ class ModelMeta(type):
         return ModelIter(cls)
 
 
+def _needs_instantiate(cls):
+    # the fast paths below skip `__init__`, which a breaked model or an
+    # overridden `_instantiate` relies on
+    return (
+        getattr(cls, '_olo_is_breaked', False) or
+        cls._instantiate.__func__ is not Model._instantiate.__func__
+    )
+
+
+def _make_row_constructor(cls, attr_names, offset):
+    if _needs_instantiate(cls):
+        end = offset + len(attr_names)
+
+        def constructor(item):
+            return cls._olo_instantiate(**dict(izip(attr_names, item[offset:end])))
+
+        return constructor
+
+    # same as `Model.__init__` with `_olo_is_new=False`, without the kwargs
+    # dict and the per row checks
+    namespace = {'cls': cls, 'new': cls.__new__}
+    lines = [
+        'def constructor(item):',
+        '    inst = new(cls)',
+        '    inst._olo_is_new = False',
+        '    inst._olo_decrypt = True',
+    ]
+    if cls._olo_compact:
+        lines.extend([
+            '    inst._parsed_data = None',
+            '    inst._dirty_fields = None',
+            '    inst._olo_qs = None',
+            '    inst._olo_qs_idx = 0',
+        ])
+    else:
+        lines.extend([
+            '    inst._parsed_data = {}',
+            '    inst._dirty_fields = set()',
+        ])
+    lines.extend([
+        '    inst._orig = None',
+        '    inst._data = {',
+    ])
+    for idx, attr_name in enumerate(attr_names):
+        value = 'item[{}]'.format(offset + idx)
+        field = cls.__encrypted_fields__.get(attr_name)
+        if field is not None:
+            namespace['decrypt_{}'.format(idx)] = field.decrypt_func
+            value = 'decrypt_{}({})'.format(idx, value)
+        lines.append('        {!r}: {},'.format(attr_name, value))
+    lines.extend([
+        '    }',
+        '    return inst',
+    ])
+    code = compile('\n'.join(lines), '<olo row constructor of {}>'.format(cls.__name__), 'exec')
+    exec(code, namespace)  # pylint: disable=exec-used
+    return namespace['constructor']
+
+
 def final_methods(cls):
     for v in itervalues(cls.__dict__):
         if inspect.isfunction(v):
@@ -489,10 +691,14 @@ class Model(with_metaclass(ModelMeta)):
     AES_KEY = '*' * 32
 
     __abstract__ = True
+    # instance slots are injected by ModelMeta for compact models
+    # pylint: disable=assigning-non-slot
+    __slots__ = ()
 
     _olo_is_new = True
     _olo_qs = None
     _olo_qs_idx = 0
+    _olo_compact = False
 
     def __init__(self, _olo_is_new=None, _olo_decrypt=True, **attrs):
         depth = 0
@@ -522,8 +728,16 @@ class Model(with_metaclass(ModelMeta)):
                 setattr(self, k, v)
 
     def _init(self):
-        self._parsed_data = {}
-        self._dirty_fields = set()
+        if self._olo_compact:
+            # allocated on first access
+            self._parsed_data = None
+            self._dirty_fields = None
+            if not hasattr(self, '_olo_qs'):
+                self._olo_qs = None
+                self._olo_qs_idx = 0
+        else:
+            self._parsed_data = {}
+            self._dirty_fields = set()
         self._orig = None
 
     def _clone(self):
@@ -547,7 +761,13 @@ class Model(with_metaclass(ModelMeta)):
         return '{}/props'.format(uuid)
 
     def __getstate__(self):
-        dct = dict(self.__dict__)
+        dct = dict(getattr(self, '__dict__', {}))
+        if self._olo_compact:
+            for k in ('_data', '_olo_is_new', '_olo_decrypt',
+                      '_olo_qs', '_olo_qs_idx'):
+                v = getattr(self, k, missing)
+                if v is not missing:
+                    dct[k] = v
         dct.pop('_dirty_fields', None)
         dct.pop('_orig', None)
         dct.pop('_parsed_data', None)
@@ -563,7 +783,11 @@ class Model(with_metaclass(ModelMeta)):
         return dct
 
     def __setstate__(self, state):
-        self.__dict__.update(state)
+        if self._olo_compact:
+            for k, v in iteritems(state):
+                setattr(self, k, v)
+        else:
+            self.__dict__.update(state)
         self._init()
 
     def __olo_setstate__(self, state):
@@ -626,20 +850,171 @@ class Model(with_metaclass(ModelMeta)):
         return is_success
 
     def update(self, **attrs):
-        # pylint: disable=too-many-statements
+        res = self._olo_before_update(attrs)
+        if res is None:
+            return False
+        assignments, sql_attrs, db_attrs = res
+
+        db = self._get_db()
+
+        if assignments:
+            expression = self.unique_expression
+            if expression is None:
+                raise ExpressionError('Cannot update this instance because of '  # noqa pragma: no cover
+                                      'the model has no primary_key '
+                                      'and unique_key')
+
+            sql_ast = [
+                'UPDATE',
+                ['TABLE', self._get_table_name()],
+                ['SET',
+                 ['SERIES'] + [asg.get_sql_ast() for asg in assignments]],
+                ['WHERE'] + [expression.get_sql_ast()]
+            ]
+
+            with db.transaction():
+                db.ast_execute(sql_ast)
+
+            self._olo_fetch_dynamic_attrs(assignments, sql_attrs)
+
+        before_update.send(self)
+
+        self._olo_apply_update(sql_attrs, db_attrs)
+
+        _orig = self._orig
+
+        def func():
+            db.commit_beansdb()
+            after_update.send(self)
+            self._olo_after_update(_orig, sql_attrs, db_attrs)
+
+        def rollback_handler():
+            self._rollback()
+
+        if db.autocommit:
+            func()
+        else:
+            db.add_lazy_func(func)
+            db.add_rollback_handler(rollback_handler)
+
+        return True
+
+    @classmethod
+    def update_multi(cls, attrs_mapping, batch_size=1000):
+        """Update the instances keyed by pk in `attrs_mapping` in batches.
+
+        The `before_update`/`after_update` methods of each instance run, but
+        only the `before_update_multi`/`after_update_multi` signals are sent;
+        receivers of the per-instance `before_update`/`after_update` signals
+        are not called.
+        """
+        insts = []
+        rows = []
+        idents = list(attrs_mapping)
+        for ident, inst in izip(idents, cls.get_multi(idents, filter_none=False)):
+            if inst is None:
+                continue
+            res = inst._olo_before_update(dict(attrs_mapping[ident]))
+            if res is None:
+                continue
+            insts.append(inst)
+            rows.append(res)
+
+        if not insts:
+            return []
+
+        db = cls._get_db()
+        pk_field = cls.get_singleness_pk_field()
+
+        groups = {}
+        for inst, (assignments, _, _) in izip(insts, rows):
+            if not assignments:
+                continue
+            names = tuple(sorted(asg.left.attr_name for asg in assignments))
+            groups.setdefault(names, []).append((inst, assignments))
+
+        with db.transaction():
+            for items in itervalues(groups):
+                for i in xrange(0, len(items), batch_size):
+                    cls._olo_update_rows(db, pk_field, items[i: i + batch_size])
+
+        for inst, (assignments, sql_attrs, _) in izip(insts, rows):
+            if assignments:
+                inst._olo_fetch_dynamic_attrs(assignments, sql_attrs)
+
+        before_update_multi.send(cls, insts=insts)
+
+        origs = []
+        for inst, (_, sql_attrs, db_attrs) in izip(insts, rows):
+            inst._olo_apply_update(sql_attrs, db_attrs)
+            origs.append(inst._orig)
+
+        def func():
+            db.commit_beansdb()
+            after_update_multi.send(cls, insts=insts)
+            for inst, _orig, (_, sql_attrs, db_attrs) in izip(insts, origs, rows):
+                inst._olo_after_update(_orig, sql_attrs, db_attrs)
+
+        def rollback_handler():
+            for inst in insts:
+                inst._rollback()
+
+        if db.autocommit:
+            func()
+        else:
+            db.add_lazy_func(func)
+            db.add_rollback_handler(rollback_handler)
+
+        return insts
+
+    @classmethod
+    def _olo_update_rows(cls, db, pk_field, items):
+        set_asts = []
+        for asg in items[0][1]:
+            field = asg.left
+            whens = []
+            for inst, assignments in items:
+                right = next(a.right for a in assignments if a.left is field)
+                whens.append([
+                    'WHEN',
+                    ['VALUE', inst._get_singleness_pk_value()],
+                    right.get_sql_ast() if isinstance(right, SQLASTInterface)
+                    else ['VALUE', right]
+                ])
+            # ELSE makes PostgreSQL resolve the CASE type by the column
+            set_asts.append([
+                'BINARY_OPERATE', '=',
+                ['QUOTE', field.name],
+                ['CASE', ['QUOTE', pk_field.name]] + whens + [
+                    ['ELSE', ['QUOTE', field.name]]
+                ]
+            ])
+        sql_ast = [
+            'UPDATE',
+            ['TABLE', cls._get_table_name()],
+            ['SET', ['SERIES'] + set_asts],
+            ['WHERE',
+             ['BINARY_OPERATE', 'IN',
+              ['QUOTE', pk_field.name],
+              ['VALUE', tuple(inst._get_singleness_pk_value()
+                              for inst, _ in items)]]]
+        ]
+        db.ast_execute(sql_ast)
+
+    def _olo_before_update(self, attrs):
         self._check_attrs(attrs)
 
         attrs = self._wash_attrs(attrs)
 
         if not attrs:
-            return False
+            return None
 
         if self._orig is None:
             self._set_orig()
 
         if self.before_update(**attrs) is False:
             self._rollback()
-            return False
+            return None
 
         for k in self.__setter_fields__:
             v = attrs.get(k, missing)
@@ -649,8 +1024,6 @@ class Model(with_metaclass(ModelMeta)):
             v = f._setter(self, v)
             attrs[k] = v
 
-        db = self._get_db()
-
         need_updates = {}
         for k, v in iteritems(self.__on_updates__):
             if k in attrs:
@@ -682,43 +1055,28 @@ class Model(with_metaclass(ModelMeta)):
         )
         if can_update is False:
             self._rollback()
-            return False
+            return None
 
-        if assignments:
-            expression = self.unique_expression
-            if expression is None:
-                raise ExpressionError('Cannot update this instance because of '  # noqa pragma: no cover
-                                      'the model has no primary_key '
-                                      'and unique_key')
-
-            sql_ast = [
-                'UPDATE',
-                ['TABLE', self._get_table_name()],
-                ['SET',
-                 ['SERIES'] + [asg.get_sql_ast() for asg in assignments]],
-                ['WHERE'] + [expression.get_sql_ast()]
-            ]
-
-            with db.transaction():
-                db.ast_execute(sql_ast)
-
-            dynamic_exps = [
-                asg for asg in assignments if isinstance(asg.right, Expression)
-            ]
-            if dynamic_exps:
-                keys = list(map(lambda x: x.left.attr_name, dynamic_exps))
-                q = self.__class__.query(*keys).filter(**{
-                    attr_name: getattr(self, attr_name)
-                    for attr_name in self.__primary_key__
-                })
-                values = q.first()
-                if not isinstance(values, tuple):
-                    values = [values]
-                _attrs = dict(izip(keys, values))
-                sql_attrs.update(self._parse_attrs(_attrs))
-
-        before_update.send(self)
+        return assignments, sql_attrs, db_attrs
 
+    def _olo_fetch_dynamic_attrs(self, assignments, sql_attrs):
+        dynamic_exps = [
+            asg for asg in assignments if isinstance(asg.right, Expression)
+        ]
+        if not dynamic_exps:
+            return
+        keys = list(map(lambda x: x.left.attr_name, dynamic_exps))
+        q = self.__class__.query(*keys).filter(**{
+            attr_name: getattr(self, attr_name)
+            for attr_name in self.__primary_key__
+        })
+        values = q.first()
+        if not isinstance(values, tuple):
+            values = [values]
+        _attrs = dict(izip(keys, values))
+        sql_attrs.update(self._parse_attrs(_attrs))
+
+    def _olo_apply_update(self, sql_attrs, db_attrs):
         clean_attrs = dict(sql_attrs, **db_attrs)
         self._data.update(clean_attrs)
         for k in clean_attrs:
@@ -728,32 +1086,17 @@ class Model(with_metaclass(ModelMeta)):
             field = getattr(self.__class__, k)
             field.db_set(self, v)
 
-        _orig = self._orig
-
-        def func():
-            db.commit_beansdb()
-            after_update.send(self)
-            self.after_update()
-            if _orig is not None:
-                self._orig = None
-                self._did_update(
-                    _orig,
-                    fields=chain.from_iterable([
-                        iterkeys(sql_attrs),
-                        iterkeys(db_attrs),
-                    ])
-                )
-
-        def rollback_handler():
-            self._rollback()
-
-        if db.autocommit:
-            func()
-        else:
-            db.add_lazy_func(func)
-            db.add_rollback_handler(rollback_handler)
-
-        return True
+    def _olo_after_update(self, _orig, sql_attrs, db_attrs):
+        self.after_update()
+        if _orig is not None:
+            self._orig = None
+            self._did_update(
+                _orig,
+                fields=chain.from_iterable([
+                    iterkeys(sql_attrs),
+                    iterkeys(db_attrs),
+                ])
+            )
 
     def delete(self, **kwargs):
         # before_delete will return None, so explicit compare with False
@@ -886,10 +1229,119 @@ class Model(with_metaclass(ModelMeta)):
         if inst._olo_insert():
             return inst
 
-    def _olo_insert(self):
-        if not self._olo_is_new:
-            return False  # pragma: no cover
+    @classmethod
+    def create_multi(cls, attrs_list, batch_size=1000):
+        """Insert the rows of `attrs_list` with multi-row INSERTs.
+
+        The `before_create`/`after_create` methods of each instance run, but
+        only the `after_insert_multi` signal is sent; receivers of the
+        per-instance `after_insert` signal are not called.
+        """
+        insts = []
+        rows = []
+        for attrs in attrs_list:
+            inst = cls._olo_instantiate(_olo_is_new=True, **attrs)
+            res = inst._olo_before_insert()
+            if res is None:
+                continue
+            insts.append(inst)
+            rows.append(res)
+
+        groups = {}
+        for inst, (sql_attrs, _) in izip(insts, rows):
+            assignments, _, _ = cls._split_attrs(sql_attrs)
+            if not assignments:
+                raise SupportError(
+                    'create_multi cannot insert a row without any column '
+                    'value: {}'.format(inst)
+                )
+            values = {asg.left.name: asg.right for asg in assignments}
+            names = tuple(sorted(values))
+            groups.setdefault(names, []).append((inst, values))
+
+        if not insts:
+            return []
+
+        db = cls._get_db()
+        pk_name = cls.get_singleness_pk_name()
+        need_pk = hasattr(cls, pk_name) and pk_name in cls.__fields__
+
+        with db.transaction():
+            for names, items in iteritems(groups):
+                for i in xrange(0, len(items), batch_size):
+                    cls._olo_insert_rows(
+                        db, pk_name, need_pk, names,
+                        items[i: i + batch_size]
+                    )
+
+        for inst, (_, db_attrs) in izip(insts, rows):
+            for k, v in iteritems(db_attrs):
+                field = getattr(cls, k)
+                field.db_set(inst, v)
+            inst._olo_is_new = False
+
+        def rollback_handler():
+            for inst in insts:
+                inst._olo_is_new = True
+
+        def func():
+            db.commit_beansdb()
+            after_insert_multi.send(cls, insts=insts)
+            for inst in insts:
+                inst._olo_after_create()
+
+        if db.autocommit:
+            func()
+        else:
+            db.add_lazy_func(func)
+            db.add_rollback_handler(rollback_handler)
+
+        return insts
+
+    @classmethod
+    def _olo_insert_rows(cls, db, pk_name, need_pk, names, items):
+        sql_ast = [
+            'INSERT',
+            ['TABLE', cls._get_table_name()],
+            ['BRACKET'] + [['QUOTE', name] for name in names],
+            ['MULTI_VALUES'] + [
+                ['BRACKET'] + [['VALUE', values[name]] for name in names]
+                for _, values in items
+            ],
+            ['RETURNING', pk_name],
+        ]
+        ids = db.ast_execute(sql_ast, insert_rows=len(items))
+
+        insts = [inst for inst, _ in items]
+        if need_pk and pk_name not in names:
+            for inst, id_ in izip(insts, ids or []):
+                inst._data[pk_name] = id_
+
+        missing_fields = [
+            getattr(cls, k) for k in cls.__fields__
+            if k not in insts[0]._data
+        ]
+        if not missing_fields:
+            return
+        if len(cls.__primary_key__) != 1:
+            for inst in insts:
+                inst._extend_missing_data()  # pragma: no cover
+            return  # pragma: no cover
+        pk_field = cls.get_singleness_pk_field()
+        mapping = {
+            str(row[0]): row[1:]
+            for row in cls.query(pk_field, *missing_fields).filter(
+                pk_field.in_([inst._get_singleness_pk_value() for inst in insts])
+            ).all()
+        }
+        for inst in insts:
+            values = mapping.get(str(inst._get_singleness_pk_value()))
+            if values:
+                inst._data.update(
+                    dict(izip(map(lambda f: f.attr_name, missing_fields), values))
+                )
 
+    def _olo_before_insert(self):
         before_create_is_instance_method = getattr(self.before_create, '__self__', None) is self  # noqa pylint: disable=C
 
         bcr = True
@@ -897,17 +1349,33 @@ class Model(with_metaclass(ModelMeta)):
             bcr = self.before_create()
 
         attrs = dict(self._data)
-        _, sql_attrs, db_attrs = self._split_attrs(attrs)
+        _, sql_attrs, db_attrs = self._split_attrs(attrs, collect_assignment=False)
 
         if not before_create_is_instance_method:
             bcr = self.before_create(**attrs)  # pragma: no cover
 
         # bcr will be none so must compare with False!!!
         if bcr is False:  # noqa
-            return False
+            return None
 
         self._validate_attrs(attrs, parse=True,
                              decrypt=self._olo_decrypt)
+        return sql_attrs, db_attrs
+
+    def _olo_after_create(self):
+        if getattr(self.after_create, '__self__', None) is self:
+            self.after_create()
+        else:
+            self.after_create(self)  # pragma: no cover pylint: disable=E
+
+    def _olo_insert(self):
+        if not self._olo_is_new:
+            return False  # pragma: no cover
+
+        res = self._olo_before_insert()
+        if res is None:
+            return False
+        sql_attrs, db_attrs = res
 
         db = self._get_db()
 
@@ -956,10 +1424,7 @@ class Model(with_metaclass(ModelMeta)):
         def func():
             db.commit_beansdb()
             after_insert.send(self)
-            if getattr(self.after_create, '__self__', None) is self:
-                self.after_create()
-            else:
-                self.after_create(self)  # pragma: no cover pylint: disable=E
+            self._olo_after_create()
 
         if db.autocommit:
             func()
@@ -1036,6 +1501,8 @@ class Model(with_metaclass(ModelMeta)):
     @classmethod
     def _get(cls, id=None, **kwargs):
         if not kwargs:
+            if context.identity_map:
+                return cls._get_multi([id], filter_none=False)[0]
             pk_name = cls.get_singleness_pk_name()
             return cls._get_by(**{pk_name: id})
         return cls._get_by(**kwargs)
@@ -1051,6 +1518,9 @@ class Model(with_metaclass(ModelMeta)):
     def _get_multi(cls, idents, filter_none=True):
         if not idents:
             return []
+        res = cls._olo_identity_get_multi(idents, filter_none, cls._get_multi)
+        if res is not None:
+            return res
         if not type_checker([dict], idents):
             pk_name = cls.get_singleness_pk_name()
             pk_field = getattr(cls, pk_name)
@@ -1150,6 +1620,7 @@ class Model(with_metaclass(ModelMeta)):
         limit = expression_dict.pop('limit', None)
         order_by = expression_dict.pop('order_by', None)
         group_by = expression_dict.pop('group_by', None)
+        after = expression_dict.pop('after', missing)
 
         q = query
         if start is not None:
@@ -1164,6 +1635,8 @@ class Model(with_metaclass(ModelMeta)):
             if not isinstance(group_by, (list, tuple)):
                 group_by = [group_by]
             q = q.group_by(*group_by)
+        if after is not missing:
+            q = q.after(after)
 
         return q.filter(*expressions, **expression_dict).all()
 
@@ -1255,24 +1728,74 @@ class Model(with_metaclass(ModelMeta)):
 
     @classmethod
     def _gen_cache_key(cls, _olo_suffix='_olo_data', **kwargs):
-        suffix = _olo_suffix
-        old_kwargs = dict(kwargs)
-        _kwargs = dict(kwargs)
-        _kwargs.pop('order_by', None)
-        kwargs = cls._parse_attrs(_kwargs)
-        old_kwargs.update(kwargs)
-        key = '{}:db:{}:({}):{}'.format(
-            cls._options.cache_key_prefix,
-            cls._get_table_name(),
-            ','.join('{}={}'.format(k, repr(v)) for k, v in sorted(
-                iteritems(old_kwargs)
-            )),
-            cls._options.cache_key_version
+        return cls._gen_cache_keys([kwargs], _olo_suffix=_olo_suffix)[0]
+
+    @classmethod
+    def _olo_get_cache_key_template(cls, names, suffix):
+        template = cls._olo_cache_key_templates.get((names, suffix))
+        if template is not None:
+            return template
+        options = cls._options
+        head = '{}:db:{}:('.format(
+            options.cache_key_prefix, cls._get_table_name()
         )
+        tail = '):{}'.format(options.cache_key_version)
         if suffix:
-            key += ':suffix:%s' % suffix
-        # avoid mc bug
-        return key.replace(' ', '&nbsp;')
+            tail += ':suffix:%s' % suffix
+        items = []
+        for name in sorted(names):
+            field = getattr(cls, name, None) if name != 'order_by' else None
+            # values of these types are returned as is by `_parse_attrs`
+            plain_type = (
+                field.type if (
+                    isinstance(field, BaseField) and
+                    field.type in (int, str, float) and
+                    not field.encrypt and not field.output
+                ) else None
+            )
+            items.append((name, '{}='.format(name), plain_type))
+        template = (
+            head.replace(' ', '&nbsp;'), tail.replace(' ', '&nbsp;'),
+            tuple(items)
+        )
+        cls._olo_cache_key_templates[(names, suffix)] = template
+        return template
+
+    @classmethod
+    def _gen_cache_keys(cls, kwargs_list, _olo_suffix='_olo_data'):
+        max_length = cls._options.cache_key_max_length
+        keys = []
+        template = names = None
+        for kwargs in kwargs_list:
+            _names = tuple(kwargs)
+            if _names != names:
+                names = _names
+                template = cls._olo_get_cache_key_template(
+                    names, _olo_suffix
+                )
+            head, tail, items = template
+            pieces = []
+            for name, prefix, plain_type in items:
+                v = kwargs[name]
+                if name != 'order_by' and type(v) is not plain_type:  # noqa pylint: disable=unidiomatic-typecheck
+                    v = cls._parse_attrs({name: v}).get(name, v)
+                # avoid mc bug
+                pieces.append(prefix + repr(v).replace(' ', '&nbsp;'))
+            body = ','.join(pieces)
+            key = head + body + tail
+            if max_length and len(key) > max_length:
+                body = 'md5={}'.format(
+                    hashlib.md5(body.encode('utf-8')).hexdigest()
+                )
+                if 'order_by' in kwargs:
+                    # keep the order_by readable, `InvalidationPlan`
+                    # regenerates the same key per order_by
+                    body += ',order_by={}'.format(
+                        repr(kwargs['order_by']).replace(' ', '&nbsp;')
+                    )
+                key = head + body + tail
+            keys.append(key)
+        return keys
 
     @property
     def unique_expression(self):
@@ -1372,3 +1895,25 @@ class Model(with_metaclass(ModelMeta)):
     @override
     def olo_validate(self):
         pass
+
+
+def _discard_identities(sender, insts=None):
+    identity_map = context.identity_map
+    if not identity_map:
+        return
+    for inst in [sender] if insts is None else insts:
+        key = identity_key(inst)
+        if identity_map.get(key) is not inst:
+            identity_map.pop(key, None)
+
+
+def _delete_identity(sender):
+    identity_map = context.identity_map
+    if identity_map:
+        identity_map.pop(identity_key(sender), None)
+
+
+for _signal in (after_insert, after_insert_multi,
+                after_update, after_update_multi):
+    _signal.connect(_discard_identities, weak=False)
+after_delete.connect(_delete_identity, weak=False)
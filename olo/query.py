@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import base64
+import json
 import operator
 import re
 import sys
 import types
+import weakref
+from collections import namedtuple
 from enum import Enum
+from functools import lru_cache
 from typing import TYPE_CHECKING, Optional, List, Union, Iterable, Type, Tuple
 
 from olo.expression import UnaryExpression, BinaryExpression, Expression
@@ -18,12 +23,13 @@ from itertools import chain
 from decorator import decorator
 
 from olo.compat import izip, imap, str_types, iteritems, reduce
+from olo.context import context, identify
 from olo.interfaces import SQLASTInterface
 from olo.field import Field
-from olo.errors import ExpressionError, OrderByError, SupportError, ORMError
+from olo.errors import ExpressionError, OrderByError, ParseError, SupportError, ORMError
 from olo.libs.compiler.translators.func_translator import transform_func
 from olo.session import QuerySession
-from olo.utils import optimize_sql_ast, friendly_repr
+from olo.utils import optimize_sql_ast, friendly_repr, missing, type_checker
 
 
 PATTERN_NEG = re.compile(r'^\-')
@@ -79,6 +85,37 @@ def _process_order_by(model_class, order_by) -> List[UnaryExpression]:
     return new
 
 
+def _make_field_converter(field):
+    model = field.get_model()
+
+    def converter(v):
+        if v is None and field.noneable:
+            return v
+        if not type_checker(field.type, v):
+            v = field.parse(v)
+            if not type_checker(field.type, v):
+                raise ParseError(
+                    'The parsed value of {}.{} is not a {} type: {}. '
+                    'Please check the parser of this field'
+                    ' or your input data.'.format(
+                        model.__name__ if model else None,
+                        field.attr_name, field.type, repr(v)
+                    )
+                )
+        if field.encrypt:
+            v = field.decrypt_func(v)
+        if field.output:
+            v = field.output(v)
+        return v
+
+    return converter
+
+
+@lru_cache(maxsize=256)
+def _get_row_class(names):
+    return namedtuple('Row', names, rename=True)
+
+
 @decorator
 def _lambda_eval(func, self, *args, **kwargs):
     if len(args) == 1 and isinstance(args[0], types.FunctionType):
@@ -186,6 +223,8 @@ class Query(SQLASTInterface):
         self._raw = False
         self._join_chain: Optional[JoinChain] = None
         self._for_update = False
+        self._after = missing
+        self._rows_mode = None
 
     def _update(self, **kwargs):
         inst = self.__class__(self._model_class)
@@ -401,6 +440,75 @@ class Query(SQLASTInterface):
         _order_by = self._order_by + list(order_by)
         return self._update(_order_by=_order_by)
 
+    def after(self, cursor):
+        return self._update(_after=cursor)
+
+    def after_token(self, item):
+        order_by = self._get_keyset_order()
+        values = self._get_keyset_values(order_by, item)
+        values = [
+            None if v is None else ob.value.deparse(v)
+            for ob, v in izip(order_by, values)
+        ]
+        token = json.dumps(values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+    def _get_keyset_order(self) -> List[UnaryExpression]:
+        order_by = list(self._order_by)
+        names = set()
+        for ob in order_by:
+            if not isinstance(ob.value, Field) or ob.operator not in ('ASC', 'DESC'):
+                raise OrderByError('`{}` is an invalid keyset order_by'.format(
+                    friendly_repr(ob.value)
+                ))
+            names.add(ob.value.attr_name)
+        # pk makes the order total, otherwise rows with same values may be skipped
+        for attr_name in self._model_class.__primary_key__:
+            if attr_name not in names:
+                order_by.append(getattr(self._model_class, attr_name).asc())
+        return order_by
+
+    def _get_keyset_values(self, order_by, cursor):
+        if isinstance(cursor, self._model_class):
+            values = [getattr(cursor, ob.value.attr_name) for ob in order_by]
+        elif isinstance(cursor, str_types):
+            try:
+                values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            except ValueError:
+                raise ExpressionError('`{}` is an invalid keyset token'.format(cursor))
+            if not isinstance(values, list) or len(values) != len(order_by):
+                raise ExpressionError('`{}` is an invalid keyset token'.format(cursor))
+            values = [
+                None if v is None else ob.value.parse(v)
+                for ob, v in izip(order_by, values)
+            ]
+        elif isinstance(cursor, (list, tuple)):
+            values = list(cursor)
+        else:
+            raise ExpressionError('`{}` is an invalid keyset cursor'.format(
+                friendly_repr(cursor)
+            ))
+        if len(values) != len(order_by):
+            raise ExpressionError('keyset cursor needs {} values, got {}'.format(
+                len(order_by), len(values)
+            ))
+        for ob, v in izip(order_by, values):
+            if v is None:
+                raise ExpressionError('keyset value of `{}` cannot be None'.format(
+                    ob.value.attr_name
+                ))
+        return values
+
+    @classmethod
+    def _get_keyset_expression(cls, order_by, values):
+        # (a, b) > (x, y) => a > x OR (a = x AND b > y), works with mixed ASC/DESC
+        exp = None
+        for ob, v in reversed(list(izip(order_by, values))):
+            f = ob.value
+            cmp = f < v if ob.operator == 'DESC' else f > v
+            exp = cmp if exp is None else cmp | ((f == v) & exp)
+        return exp
+
     def group_by(self, *group_by):
         _group_by = self._group_by + list(group_by)
         return self._update(_group_by=_group_by)
@@ -418,6 +526,46 @@ class Query(SQLASTInterface):
     def all(self):
         return list(self.__iter__())
 
+    def tuples(self):
+        return self._update(_rows_mode='tuples')
+
+    def namedtuples(self):
+        return self._update(_rows_mode='namedtuples')
+
+    def dicts(self):
+        return self._update(_rows_mode='dicts')
+
+    def stream(self, batch_size=1000):
+        """Iterate the results through a server-side cursor.
+
+        The cursor owns a separate pooled connection, so it does not see the
+        uncommitted changes of the caller's open transaction. The connection
+        is released once the generator is exhausted, closed or collected.
+        """
+        sql_ast = self.get_sql_ast()
+        with self.db.transaction():
+            cursor = self.db.get_stream_cursor()
+            try:
+                cursor.ast_execute(sql_ast)
+            except Exception:
+                cursor.close()
+                raise
+        gen = self._iter_stream(cursor, batch_size)
+        weakref.finalize(gen, cursor.close)
+        return gen
+
+    def _iter_stream(self, cursor, batch_size):
+        try:
+            seen = set()
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for item in self._iter_wrap_rv(rows, seen=seen):
+                    yield item
+        finally:
+            cursor.close()
+
     def count(self):
         from olo.funcs import COUNT
         return COUNT(self).first()  # pylint: disable=E1101
@@ -539,10 +687,24 @@ class Query(SQLASTInterface):
 
     def _get_primitive_sql_ast(self, base_sql_ast):
         sql_ast = list(base_sql_ast)  # copy ast
-        if self._expression is not None:
+        expression = self._expression
+        order_by = self._order_by
+
+        if self._after is not missing:
+            order_by = self._get_keyset_order()
+            if self._after is not None:
+                keyset_expression = self._get_keyset_expression(
+                    order_by, self._get_keyset_values(order_by, self._after)
+                )
+                if expression is None:
+                    expression = keyset_expression
+                else:
+                    expression = expression & keyset_expression
+
+        if expression is not None:
             sql_ast.append([
                 'WHERE',
-                self._expression.get_sql_ast()
+                expression.get_sql_ast()
             ])
 
         if self._having_expression is not None and not self._group_by:
@@ -576,10 +738,10 @@ class Query(SQLASTInterface):
                 self._having_expression.get_sql_ast()
             ])
 
-        if self._order_by:
+        if order_by:
             sql_ast.append([
                 'ORDER BY',
-                ['SERIES'] + [f.get_sql_ast() for f in self._order_by]
+                ['SERIES'] + [f.get_sql_ast() for f in order_by]
             ])
 
         if self._limit is not None:
@@ -632,10 +794,58 @@ class Query(SQLASTInterface):
         sql_ast = ['SELECT', select_ast, ['FROM', table_section]]
         return sql_ast
 
+    def _get_row_columns(self):
+        from olo.model import ModelMeta
+
+        names = []
+        converters = []
+        for idx, v in enumerate(self._entities):
+            if isinstance(v, ModelMeta):
+                for attr_name in v.__sorted_fields__:
+                    names.append(attr_name)
+                    converters.append(_make_field_converter(getattr(v, attr_name)))
+                continue
+            if isinstance(v, Field):
+                names.append(v.alias_name or v.attr_name)
+                converters.append(_make_field_converter(v))
+                continue
+            if isinstance(v, Function):
+                names.append(v.alias_name or v.__class__.__name__.lower())
+            else:
+                names.append('_{}'.format(idx))  # pragma: no cover
+            converters.append(None)
+        if self._raw:
+            converters = [None] * len(converters)
+        # namedtuple renames invalid and duplicate names, reuse them as dict keys
+        return _get_row_class(tuple(names)), converters
+
+    def _iter_rows(self, rv):
+        row_class, converters = self._get_row_columns()
+        columns = list(enumerate(converters))
+        mode = self._rows_mode
+        names = row_class._fields
+
+        for item in rv:
+            values = [
+                item[idx] if converter is None else converter(item[idx])
+                for idx, converter in columns
+            ]
+            if mode == 'namedtuples':
+                yield row_class._make(values)
+            elif mode == 'dicts':
+                yield dict(izip(names, values))
+            else:
+                yield tuple(values)
+
     # pylint: disable=E0602
-    def _iter_wrap_rv(self, rv):
+    def _iter_wrap_rv(self, rv, seen=None):
         from olo.model import ModelMeta
 
+        if self._rows_mode is not None:
+            for row in self._iter_rows(rv):
+                yield row
+            return
+
         entity_count = len(self._entities)
         raw = self._raw
 
@@ -659,17 +869,15 @@ class Query(SQLASTInterface):
             idx += 1
 
             if isinstance(v, ModelMeta):
-                fields_count = len(v.__fields__)
-                producers.append((
-                    lambda idx, v:
-                    lambda item: v._olo_instantiate(**dict(
-                        izip(
-                            v.__sorted_fields__,
-                            item[idx: idx + fields_count]
-                        )  # pylint: disable=W
-                    ))
-                )(idx, v))
-                idx += fields_count - 1
+                attr_names = tuple(v.__sorted_fields__)
+                constructor = v._olo_get_row_constructor(attr_names, idx)
+                if context.identity_map is not None:
+                    constructor = (
+                        lambda constructor:
+                        lambda item: identify(constructor(item))
+                    )(constructor)
+                producers.append(constructor)
+                idx += len(attr_names) - 1
                 continue
 
             if isinstance(v, Field):
@@ -683,7 +891,8 @@ class Query(SQLASTInterface):
 
         session = QuerySession()
 
-        seen = set()
+        if seen is None:
+            seen = set()
 
         for idx, item in enumerate(rv):
             new_item = tuple(imap(lambda f: f(item), producers))  # noqa pylint: disable=W
@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+from olo.compat import iteritems
+from olo.logger import logger
+from olo.stats import NodeStats
+
+_FLUSH = object()
+
+
+def _hash(key):
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    return int.from_bytes(hashlib.md5(key).digest()[:4], 'big')
+
+
+class ShardedCacheClient(object):
+    """Memcached style client spreading keys over `nodes` on a consistent
+    hash ring with `replicas` virtual nodes per node.
+
+    Multi-key calls are split per node and sent concurrently. A node that
+    raises is skipped for `dead_retry` seconds; its reads are misses (so
+    olo loads from the database) and its writes fail. The keys of the
+    writes a dead node misses are deleted from it before it is used again
+    (the whole node is flushed past `max_pending` keys), so it never serves
+    a value invalidated while it was down. The node clients are called
+    from a thread pool and must be thread safe.
+    """
+
+    def __init__(self, nodes, replicas=160, max_workers=None,
+                 dead_retry=30, stats=None, max_pending=10000):
+        if not isinstance(nodes, dict):
+            nodes = {str(idx): node for idx, node in enumerate(nodes)}
+        assert nodes, 'nodes is empty'
+        self.nodes = dict(nodes)
+        self.replicas = replicas
+        self.dead_retry = dead_retry
+        self.max_pending = max_pending
+        self.stats = NodeStats() if stats is None else stats
+        self._lock = threading.Lock()
+        self._dead_until = {}
+        self._pending = {}
+        ring = sorted(
+            (_hash('{}-{}'.format(name, idx)), name)
+            for name in self.nodes
+            for idx in range(replicas)
+        )
+        self._ring_hashes = [h for h, _ in ring]
+        self._ring_nodes = [name for _, name in ring]
+        self._executor = (
+            ThreadPoolExecutor(max_workers or len(self.nodes))
+            if len(self.nodes) > 1 else None
+        )
+
+    def get_node(self, key):
+        idx = bisect(self._ring_hashes, _hash(key))
+        return self._ring_nodes[idx % len(self._ring_nodes)]
+
+    def _mark_dead(self, name, keys=None):
+        with self._lock:
+            self._dead_until[name] = time.time() + self.dead_retry
+            self._add_pending(name, keys)
+
+    def _add_pending(self, name, keys):
+        if not keys:
+            return
+        pending = self._pending.get(name)
+        if pending is _FLUSH:
+            return
+        pending = self._pending.setdefault(name, set())
+        pending.update(keys)
+        if len(pending) > self.max_pending:
+            self._pending[name] = _FLUSH
+
+    def _is_alive(self, name, keys=None):
+        with self._lock:
+            dead_until = self._dead_until.get(name)
+            if dead_until is None:
+                return True
+            if dead_until > time.time():
+                self._add_pending(name, keys)
+                return False
+            # hold the node dead while replaying the missed invalidations
+            self._dead_until[name] = time.time() + self.dead_retry
+            pending = self._pending.pop(name, None)
+        node = self.nodes[name]
+        try:
+            if pending is _FLUSH:
+                node.flush_all()
+            elif pending:
+                node.delete_multi(list(pending))
+        except Exception:  # pylint: disable=broad-except
+            logger.warning(
+                '[CACHE]: node %s failed on revival', name, exc_info=True
+            )
+            with self._lock:
+                self._add_pending(name, pending)
+                self._add_pending(name, keys)
+            return False
+        with self._lock:
+            self._dead_until.pop(name, None)
+        return True
+
+    def _call(self, name, method, args, kwargs=None, default=None,
+              keys=None):
+        if not self._is_alive(name, keys):
+            return default
+        start = time.time()
+        try:
+            res = getattr(self.nodes[name], method)(*args, **(kwargs or {}))
+        except Exception:  # pylint: disable=broad-except
+            self._mark_dead(name, keys)
+            self.stats.record(name, time.time() - start, error=True)
+            logger.warning(
+                '[CACHE]: node %s failed on %s', name, method, exc_info=True
+            )
+            return default
+        self.stats.record(name, time.time() - start)
+        return res
+
+    def _call_multi(self, method, groups, args, kwargs, default,
+                    write=False):
+        calls = [
+            (name, method, (group,) + args, kwargs, default,
+             list(group) if write else None)
+            for name, group in iteritems(groups)
+        ]
+        if self._executor is None or len(calls) < 2:
+            return [self._call(*call) for call in calls]
+        futures = [self._executor.submit(self._call, *call) for call in calls]
+        return [future.result() for future in futures]
+
+    def _group_keys(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.get_node(key), []).append(key)
+        return groups
+
+    def get(self, key):
+        return self._call(self.get_node(key), 'get', (key,))
+
+    def get_multi(self, keys):
+        res = {}
+        for mapping in self._call_multi(
+                'get_multi', self._group_keys(keys), (), None, None
+        ):
+            if mapping:
+                res.update(mapping)
+        return res
+
+    def gets(self, key):
+        # a `gets` is always followed by a `cas`, remember the key if the
+        # node is down so that the skipped write is replayed as a delete
+        return self._call(self.get_node(key), 'gets', (key,), None, None, [key])
+
+    def set(self, key, val, *args, **kwargs):
+        return self._call(
+            self.get_node(key), 'set', (key, val) + args, kwargs, False,
+            [key]
+        )
+
+    def set_multi(self, values, *args, **kwargs):
+        groups = {}
+        for key, val in iteritems(values):
+            groups.setdefault(self.get_node(key), {})[key] = val
+        return all(self._call_multi(
+            'set_multi', groups, args, kwargs, False, write=True
+        ))
+
+    def add(self, key, val, *args, **kwargs):
+        return self._call(
+            self.get_node(key), 'add', (key, val) + args, kwargs, False,
+            [key]
+        )
+
+    def cas(self, key, val, *args, **kwargs):
+        return self._call(
+            self.get_node(key), 'cas', (key, val) + args, kwargs, False,
+            [key]
+        )
+
+    def incr(self, key, *args, **kwargs):
+        return self._call(
+            self.get_node(key), 'incr', (key,) + args, kwargs, None, [key]
+        )
+
+    def decr(self, key, *args, **kwargs):
+        return self._call(
+            self.get_node(key), 'decr', (key,) + args, kwargs, None, [key]
+        )
+
+    def delete(self, key):
+        return self._call(
+            self.get_node(key), 'delete', (key,), None, False, [key]
+        )
+
+    def delete_multi(self, keys):
+        return all(self._call_multi(
+            'delete_multi', self._group_keys(keys), (), None, False,
+            write=True
+        ))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -50,6 +50,10 @@ class MySQLSQLASTTranslator(SQLASTTranslator):
         sql_pieces, params = self.reduce(args)
         return 'VALUES({})'.format(', '.join(sql_pieces)), params
 
+    def post_MULTI_VALUES(self, *rows):
+        sql_pieces, params = self.reduce(rows)
+        return 'VALUES {}'.format(', '.join(sql_pieces)), params
+
     def post_MODIFIER(self, modifier, select_ast):
         sql_piece, params = self.translate(select_ast)
         return '{} {}'.format(modifier, sql_piece), params
@@ -213,6 +217,18 @@ class MySQLSQLASTTranslator(SQLASTTranslator):
         sql_pieces.append('END')
         return ' '.join(sql_pieces), params
 
+    def post_CASE(self, *args):
+        sql_pieces, params = self.reduce(args)
+        return 'CASE {} END'.format(' '.join(sql_pieces)), params
+
+    def post_WHEN(self, test_ast, then_ast):
+        sql_pieces, params = self.reduce([test_ast, then_ast])
+        return 'WHEN {} THEN {}'.format(*sql_pieces), params
+
+    def post_ELSE(self, else_ast):
+        sql_piece, params = self.translate(else_ast)
+        return 'ELSE {}'.format(sql_piece), params
+
     def post_CREATE_INDEX(self, if_not_exists, idx_name, tbl_name, field_names):
         sql = (
             f"CREATE INDEX {'IF NOT EXISTS ' if if_not_exists else ''} {self.post_QUOTE(idx_name)[0]} "
@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Iterable, Optional
 
 from olo.compat import iteritems
@@ -51,11 +53,137 @@ def detect_table_alias(sql_ast: AST) -> Tuple[AST, Dict[str, str]]:
     return sql_ast, alias_mapping
 
 
+class _Slot(object):
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+_VALUE_SHAPE = object()
+
+
+def _fingerprint_sql_ast(sql_ast: AST, values: List) -> tuple:
+    res = []
+    for x in sql_ast:
+        if isinstance(x, list):
+            if len(x) == 2 and x[0] == 'VALUE':
+                values.append(x[1])
+                res.append(_VALUE_SHAPE)
+            else:
+                res.append(_fingerprint_sql_ast(x, values))
+        elif x.__class__ is str or x is None:
+            res.append(x)
+        else:
+            res.append((x.__class__, x))
+    return tuple(res)
+
+
+def fingerprint_sql_ast(sql_ast: AST) -> Tuple[Optional[tuple], List]:
+    values = []
+    shape = _fingerprint_sql_ast(sql_ast, values)
+    try:
+        hash(shape)
+    except TypeError:
+        return None, values
+    return shape, values
+
+
+def _slot_sql_ast(sql_ast: AST, slots: List[_Slot]) -> AST:
+    res = []
+    for x in sql_ast:
+        if isinstance(x, list):
+            if len(x) == 2 and x[0] == 'VALUE':
+                slot = _Slot(len(slots))
+                slots.append(slot)
+                x = ['VALUE', slot]
+            else:
+                x = _slot_sql_ast(x, slots)
+        res.append(x)
+    return res
+
+
+class StatementCache(object):
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'max_size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 class SQLASTTranslator(object):
+    def __init__(self, statement_cache_size=1024):
+        self.statement_cache = (
+            StatementCache(statement_cache_size)
+            if statement_cache_size else None
+        )
+
     def translate(self, sql_ast: AST) -> Tuple[str, List]:
         if not is_sql_ast(sql_ast):
             raise ORMError(f'{friendly_repr(sql_ast)} is not a valid sql ast!')
 
+        if self.statement_cache is None or context.in_sql_translation:
+            return self._translate(sql_ast)
+
+        shape, values = fingerprint_sql_ast(sql_ast)
+        if shape is None:
+            return self._translate(sql_ast)
+
+        key = (shape, context.alias_only)
+        entry = self.statement_cache.get(key)
+        if entry is None:
+            slots = []
+            entry = self._translate(_slot_sql_ast(sql_ast, slots))
+            params_slots = [p for p in entry[1] if p.__class__ is _Slot]
+            # the translator consumed some values by itself
+            if sorted(s.index for s in params_slots) != list(range(len(slots))):
+                return self._translate(sql_ast)
+            self.statement_cache.set(key, entry)
+
+        sql, params_tpl = entry
+        return sql, [
+            values[p.index] if p.__class__ is _Slot else p
+            for p in params_tpl
+        ]
+
+    def _translate(self, sql_ast: AST) -> Tuple[str, List]:
         alias_mapping = None
         if not context.in_sql_translation:
             sql_ast, alias_mapping = detect_table_alias(sql_ast)
@@ -0,0 +1,246 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+_OLO_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_ORIGIN_FILES = frozenset(
+    os.path.join(_OLO_DIR, name)
+    for name in ('model.py', 'query.py', 'cache.py', 'cached_query.py')
+)
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w"`.])-?\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    sql = _STRING_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(?+)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _get_origin(frame):
+    origin = None
+    depth = 0
+    while frame is not None and depth < 32:
+        filename = frame.f_code.co_filename
+        if filename in _ORIGIN_FILES:
+            f_locals = frame.f_locals
+            obj = f_locals.get('self', f_locals.get('cls'))
+            if obj is not None:
+                origin = (obj, frame.f_code.co_name)
+        elif not filename.startswith(_OLO_DIR):
+            break
+        frame = frame.f_back
+        depth += 1
+    if origin is None:
+        return None
+    obj, name = origin
+    if isinstance(obj, type):
+        return '{}.{}'.format(obj.__name__, name)
+    model_class = getattr(obj, '_model_class', None)
+    if model_class is None:
+        return '{}.{}'.format(obj.__class__.__name__, name)
+    return '{}.{}.{}'.format(
+        model_class.__name__, obj.__class__.__name__, name
+    )
+
+
+def _percentile(samples, p):
+    k = (len(samples) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(samples) - 1)
+    return samples[f] + (samples[c] - samples[f]) * (k - f)
+
+
+class StatementStat(object):
+    __slots__ = ('fingerprint', 'calls', 'total_time', 'min_time',
+                 'max_time', 'rows', 'origins', 'samples')
+
+    def __init__(self, fingerprint, sample_size):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.rows = 0
+        self.origins = {}
+        self.samples = deque(maxlen=sample_size)
+
+    def add(self, elapsed, rows, origin):
+        self.calls += 1
+        self.total_time += elapsed
+        if self.min_time is None or elapsed < self.min_time:
+            self.min_time = elapsed
+        if self.max_time is None or elapsed > self.max_time:
+            self.max_time = elapsed
+        if rows is not None and rows > 0:
+            self.rows += rows
+        if origin is not None:
+            self.origins[origin] = self.origins.get(origin, 0) + 1
+        self.samples.append(elapsed)
+
+    def to_dict(self):
+        samples = sorted(self.samples)
+        return {
+            'fingerprint': self.fingerprint,
+            'calls': self.calls,
+            'total_time': self.total_time,
+            'mean_time': self.total_time / self.calls,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'p50': _percentile(samples, 50),
+            'p90': _percentile(samples, 90),
+            'p99': _percentile(samples, 99),
+            'rows': self.rows,
+            'origins': dict(self.origins),
+        }
+
+
+class BaseStats(object):
+    def __init__(self, exporter=None, export_interval=60):
+        self.exporter = exporter
+        self.export_interval = export_interval
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._last_export = time.time()
+
+    def _maybe_export(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_export < self.export_interval:
+                return
+            self._last_export = now
+        self.exporter(self.snapshot())
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class StatementStats(BaseStats):
+    """In-process statement statistics, keyed by normalized SQL.
+
+    Assign an instance to `db.statement_stats` to start recording.
+    """
+
+    def __init__(self, max_statements=1000, sample_size=1024,
+                 exporter=None, export_interval=60, track_origin=True):
+        super(StatementStats, self).__init__(
+            exporter=exporter, export_interval=export_interval
+        )
+        self.max_statements = max_statements
+        self.sample_size = sample_size
+        self.track_origin = track_origin
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._stats)
+
+    def record(self, sql, elapsed, rows=None, origin=None):
+        if origin is None and self.track_origin:
+            origin = _get_origin(sys._getframe(1))  # pylint: disable=protected-access
+        key = fingerprint(sql)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                if len(self._stats) >= self.max_statements:
+                    self.dropped += 1
+                    return
+                stat = self._stats[key] = StatementStat(key, self.sample_size)
+            stat.add(elapsed, rows, origin)
+        if self.exporter is not None:
+            self._maybe_export()
+
+    def snapshot(self):
+        with self._lock:
+            stats = [stat.to_dict() for stat in self._stats.values()]
+        return sorted(stats, key=lambda x: x['total_time'], reverse=True)
+
+    def reset(self):
+        super(StatementStats, self).reset()
+        self.dropped = 0
+
+
+class CacheStats(BaseStats):
+    """Cache hit/miss/fallback counters per model class and method."""
+
+    def record(self, model_class, method, hits=0, misses=0, fallback=None,
+               nbytes=0):
+        key = (
+            '{}.{}'.format(model_class.__module__, model_class.__qualname__),
+            method
+        )
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = {
+                    'hits': 0, 'misses': 0, 'bytes': 0, 'fallbacks': {}
+                }
+            stat['hits'] += hits
+            stat['misses'] += misses
+            stat['bytes'] += nbytes
+            if fallback is not None:
+                fallbacks = stat['fallbacks']
+                fallbacks[fallback] = fallbacks.get(fallback, 0) + 1
+        if self.exporter is not None:
+            self._maybe_export()
+
+    def snapshot(self):
+        res = []
+        with self._lock:
+            for (model_name, method), stat in sorted(self._stats.items()):
+                hits, misses = stat['hits'], stat['misses']
+                res.append({
+                    'model': model_name,
+                    'method': method,
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': (
+                        hits / float(hits + misses)
+                        if hits + misses else None
+                    ),
+                    'bytes': stat['bytes'],
+                    'fallbacks': dict(stat['fallbacks']),
+                })
+        return res
+
+
+class NodeStats(BaseStats):
+    """Call counts and latencies per cache node."""
+
+    def record(self, node, elapsed, error=False):
+        with self._lock:
+            stat = self._stats.get(node)
+            if stat is None:
+                stat = self._stats[node] = {
+                    'calls': 0, 'errors': 0, 'total_time': 0.0,
+                    'max_time': 0.0,
+                }
+            stat['calls'] += 1
+            stat['errors'] += bool(error)
+            stat['total_time'] += elapsed
+            stat['max_time'] = max(stat['max_time'], elapsed)
+        if self.exporter is not None:
+            self._maybe_export()
+
+    def snapshot(self):
+        res = []
+        with self._lock:
+            for node, stat in sorted(self._stats.items()):
+                res.append(dict(
+                    stat, node=node,
+                    mean_time=stat['total_time'] / stat['calls'],
+                ))
+        return res
@@ -1,12 +1,21 @@
 # coding: utf-8
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import libmc
+from mock import patch
+
 from olo.logger import logger
 from .base import db, TestCase, Dummy, Foo, Bar, Lala
 from .utils import (
     auto_use_cache_ctx, patched_execute, no_cache_client,
     no_pk, AE
 )
-from olo.cache import create_cache
-from olo.utils import missing
+from olo.cache import (CacheWrapper, SingleFlight, create_cache, cache_stats,
+                       get_many, get_delete_cache_keys)
+from olo.cache_codec import CompactCacheCodec, DictCacheCodec
+from olo.utils import missing, ThreadedObject
 from olo.errors import CacheError
 
 
@@ -655,6 +664,48 @@ class TestCache(TestCase):
             self.assertEqual(bars, [b0, b1])
             self.assertFalse(execute.called)
 
+    def test_gets_by_after(self):
+        b0 = Bar.create(name='e', xixi='b', age=1)
+        b1 = Bar.create(name='f', xixi='a', age=1)
+        b2 = Bar.create(name='g', xixi='c', age=1)
+
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'),
+                                     after=None)
+            self.assertEqual(bars, [b1, b0, b2])
+            self.assertTrue(execute.called)
+
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'),
+                                     after=b0, limit=2)
+            self.assertEqual(bars, [b2])
+            self.assertFalse(execute.called)
+
+        token = Bar.query.order_by('xixi', 'age').after_token(b1)
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'),
+                                     after=token, limit=1)
+            self.assertEqual(bars, [b0])
+            self.assertFalse(execute.called)
+
+        b3 = Bar.create(name='h', xixi='b', age=2)
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'),
+                                     after=b3, limit=1)
+            self.assertEqual(bars, [b2])
+            self.assertTrue(execute.called)
+
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, after=b1)
+            self.assertEqual(bars, [b2])
+            self.assertTrue(execute.called)
+
+        with patch.object(Bar, '_get_multi_by', return_value=[]) as get_multi_by:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'),
+                                     after=('b', 1), limit=1)
+            self.assertEqual(bars, [])
+            self.assertEqual(get_multi_by.call_args[1]['after'], ('b', 1))
+
     def test_gets_by_missing_value(self):
         Bar.create(name='b', xixi='b', age=1)
         Bar.create(name='c', xixi='b', age=1)
@@ -710,6 +761,36 @@ class TestCache(TestCase):
         finally:
             Bar.cache.MAX_COUNT = max_count
 
+    def test_gets_by_segments(self):
+        class SegBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_ids_segment_size = 2
+                cache_ids_max_segments = 2
+
+        for name in 'abcdefg':
+            SegBar.create(name=name, xixi=name, age=1)
+
+        def gets_by(start):
+            return [x.name for x in SegBar.cache.gets_by(
+                age=1, order_by=SegBar.xixi, start=start, limit=2
+            )]
+
+        with patch.object(CacheWrapper, 'MAX_COUNT', 2):
+            self.assertEqual(gets_by(2), ['c', 'd'])
+            self.assertEqual(gets_by(4), ['e', 'f'])
+            with patched_execute as execute:
+                self.assertEqual(gets_by(2), ['c', 'd'])
+                self.assertEqual(gets_by(4), ['e', 'f'])
+                self.assertFalse(execute.called)
+            with patched_execute as execute:
+                self.assertEqual(gets_by(6), ['g'])
+                self.assertTrue(execute.called)
+            SegBar.create(name='bb', xixi='bb', age=1)
+            self.assertEqual(gets_by(2), ['bb', 'c'])
+            self.assertEqual(gets_by(4), ['d', 'e'])
+
     def test_count_by(self):
         with patched_execute as execute:
             c = Bar.cache.count_by(xixi='a', age=1)
@@ -796,6 +877,513 @@ class TestCache(TestCase):
             self.assertEqual(c, 1)
             self.assertFalse(execute.called)
 
+    def test_create_multi(self):
+        with patched_execute as execute:
+            c = Bar.cache.count_by(xixi='a', age=1)
+            self.assertEqual(c, 0)
+            self.assertTrue(execute.called)
+        Bar.create_multi([
+            dict(name='a', xixi='a', age=1),
+            dict(name='b', xixi='a', age=1),
+        ])
+        with patched_execute as execute:
+            c = Bar.cache.count_by(xixi='a', age=1)
+            self.assertEqual(c, 2)
+            self.assertTrue(execute.called)
+        with patched_execute as execute:
+            c = Bar.cache.count_by(xixi='a', age=1)
+            self.assertEqual(c, 2)
+            self.assertFalse(execute.called)
+
+    def test_update_multi(self):
+        b0 = Bar.create(name='e', xixi='b', age=1)
+        b1 = Bar.create(name='f', xixi='a', age=1)
+        bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'))
+        self.assertEqual(bars, [b1, b0])
+        self.assertEqual(Bar.cache.count_by(xixi='c', age=1), 0)
+        cache_client = Bar._options.cache_client
+        with patch.object(cache_client, 'delete_multi',
+                          wraps=cache_client.delete_multi) as delete_multi:
+            Bar.update_multi({
+                'e': dict(xixi='c'),
+                'f': dict(word='x'),
+            })
+            # before_update_multi + after_update_multi
+            self.assertEqual(delete_multi.call_count, 2)
+        with patched_execute as execute:
+            bars = Bar.cache.gets_by(age=1, order_by=('xixi', 'age'))
+            self.assertEqual([b.name for b in bars], ['f', 'e'])
+            self.assertEqual(bars[0].word, 'x')
+            self.assertTrue(execute.called)
+        self.assertEqual(Bar.cache.count_by(xixi='c', age=1), 1)
+
+    def test_local_cache(self):
+        class LocalBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                local_cache_size = 2
+                local_cache_ttl = 60
+
+        self.assertIsNone(Bar._options.local_cache)
+        local_cache = LocalBar._options.local_cache
+        LocalBar.create(name='a', xixi='a', age=1, word='a')
+        b = LocalBar.create(name='b', xixi='b', age=1, word='b')
+        cache_client = LocalBar._options.cache_client
+        with patch.object(cache_client, 'get_multi',
+                          wraps=cache_client.get_multi) as get_multi:
+            self.assertEqual(LocalBar.cache.get('a').word, 'a')
+            self.assertEqual(get_multi.call_count, 1)
+            with patched_execute as execute:
+                self.assertEqual(LocalBar.cache.get('a').word, 'a')
+                self.assertEqual(LocalBar.cache.get_by(name='a').word, 'a')
+                self.assertFalse(execute.called)
+            self.assertEqual(get_multi.call_count, 1)
+            self.assertEqual(
+                [x.name for x in LocalBar.cache.gets(['a', 'b', 'c'])],
+                ['a', 'b']
+            )
+            self.assertEqual(get_multi.call_count, 2)
+        self.assertEqual(local_cache.stats()['evictions'], 1)
+        self.assertEqual(len(local_cache), 2)
+        b.update(word='bb')
+        self.assertEqual(LocalBar.cache.get('b').word, 'bb')
+        self.assertEqual(local_cache.stats()['hits'], 3)
+        local_cache.ttl = 0
+        local_cache.clear()
+        LocalBar.cache.get('b')
+        LocalBar.cache.get('b')
+        self.assertEqual(local_cache.stats()['hits'], 0)
+        self.assertEqual(local_cache.stats()['misses'], 2)
+
+    def test_stampede_protection(self):
+        cache_client = ThreadedObject(libmc.Client, ['localhost:11211'])
+        for mode in ('single_flight', 'lease'):
+            class StampedeBar(Bar):
+                __table_name__ = 'bar'
+
+                class Options:
+                    cache_stampede_protection = mode
+                    cache_lease_wait = 2
+
+            StampedeBar._options.cache_client = cache_client
+
+            StampedeBar.create(name=mode, xixi=mode, age=1)
+            orig_get_by = StampedeBar._get_by
+            calls = []
+
+            def slow_get_by(**kwargs):
+                calls.append(kwargs)
+                time.sleep(0.2)
+                return orig_get_by(**kwargs)
+
+            with patch.object(StampedeBar, '_get_by',
+                              side_effect=slow_get_by):
+                with ThreadPoolExecutor(max_workers=5) as exe:
+                    res = list(exe.map(
+                        lambda _: StampedeBar.cache.get_by(name=mode),
+                        range(5)
+                    ))
+            self.assertEqual(len(calls), 1)
+            self.assertEqual([x.name for x in res], [mode] * 5)
+            if mode == 'lease':
+                self.assertIsNone(
+                    cache_client.get(
+                        StampedeBar._gen_cache_key(name=mode) + ':lease'
+                    )
+                )
+
+        class LeaseBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_stampede_protection = 'lease'
+                cache_lease_poll = 0.01
+                local_cache_size = 10
+
+        LeaseBar._options.cache_client = cache_client
+        key = LeaseBar._gen_cache_key(_olo_suffix='ids', age=1)
+        cache_client.set(key, ['a'])
+        cache_client.add(key + ':lease', 1)
+        try:
+            self.assertEqual(
+                LeaseBar.cache._load_multi([key], dict), {key: ['a']}
+            )
+        finally:
+            cache_client.delete_multi([key, key + ':lease'])
+        self.assertEqual(LeaseBar._options.local_cache.get_multi([key]), {})
+
+    def test_single_flight_multi(self):
+        flight = SingleFlight()
+        loaded = []
+
+        def load(keys):
+            loaded.append(sorted(keys))
+            time.sleep(0.2)
+            return {k: k.upper() for k in keys}
+
+        with ThreadPoolExecutor(max_workers=2) as exe:
+            first = exe.submit(flight.do_multi, ['a', 'b'], load)
+            time.sleep(0.05)
+            second = exe.submit(flight.do_multi, ['c', 'b'], load)
+            self.assertEqual(first.result(), {'a': 'A', 'b': 'B'})
+            self.assertEqual(second.result(), {'b': 'B', 'c': 'C'})
+        self.assertEqual(loaded, [['a', 'b'], ['c']])
+        self.assertEqual(flight.do_multi(['a'], lambda keys: {}), {})
+
+    def test_cache_stats(self):
+        exported = []
+        cache_stats.reset()
+        cache_stats.exporter = exported.append
+        cache_stats.export_interval = 0
+        try:
+            bar = Bar.create(name='a', xixi='a', age=1)
+            Bar.cache.get('a')
+            Bar.cache.get('a')
+            Bar.cache.gets(['a', 'b'])
+            Bar.cache.get_by(name='a')
+            Bar.cache.gets_by(age=1)
+            Bar.cache.gets_by(word='a')
+            Bar.cache.gets_by(age=1, order_by=Bar.word)
+            Bar.cache.count_by(age=1)
+            Bar.cache.count_by(age=1)
+            with no_cache_client(Bar):
+                Bar.cache.get(bar.name)
+        finally:
+            cache_stats.exporter = None
+        stats = {x['method']: x for x in cache_stats.snapshot()
+                 if x['model'] == 'tests.base.Bar'}
+        self.assertEqual(exported[-1], cache_stats.snapshot())
+        self.assertEqual(
+            (stats['get']['hits'], stats['get']['misses']), (1, 1)
+        )
+        self.assertEqual(stats['get']['hit_ratio'], 0.5)
+        self.assertEqual(stats['get']['fallbacks'], {'no_cache_client': 1})
+        self.assertEqual(
+            (stats['get_multi']['hits'], stats['get_multi']['misses']),
+            (2, 1)
+        )
+        self.assertEqual(
+            (stats['get_by']['hits'], stats['get_by']['misses']), (1, 0)
+        )
+        self.assertEqual(stats['get_multi_by']['misses'], 1)
+        self.assertEqual(stats['get_multi_by']['fallbacks'], {
+            'not_indexed': 1, 'order_by': 1,
+        })
+        self.assertEqual(
+            (stats['count_by']['hits'], stats['count_by']['misses']), (1, 1)
+        )
+        self.assertGreater(stats['get_multi']['bytes'], 0)
+        self.assertEqual(stats['count_by']['bytes'], 0)
+
+        # same class name, another module
+        type('Bar', (Foo,), {
+            '__module__': __name__, '__table_name__': 'foo'
+        }).cache.get(1)
+        models = {x['model'] for x in cache_stats.snapshot()}
+        self.assertIn('tests.base.Bar', models)
+        self.assertIn('tests.test_cache.Bar', models)
+        cache_stats.reset()
+        self.assertEqual(cache_stats.snapshot(), [])
+
+    def test_incr_counts(self):
+        class CountBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_incr_counts = True
+
+        a = CountBar.create(name='a', xixi='a', age=1)
+        CountBar.create(name='b', xixi='b', age=1)
+        self.assertEqual(CountBar.cache.count_by(age=1), 2)
+        self.assertEqual(CountBar.cache.count_by(age=2), 0)
+        c = CountBar.create(name='c', xixi='c', age=1)
+        with patched_execute as execute:
+            self.assertEqual(CountBar.cache.count_by(age=1), 3)
+            self.assertFalse(execute.called)
+        c.update(age=2)
+        a.age = 2
+        a.save()
+        with patched_execute as execute:
+            self.assertEqual(CountBar.cache.count_by(age=1), 1)
+            self.assertEqual(CountBar.cache.count_by(age=2), 2)
+            self.assertFalse(execute.called)
+        c.delete()
+        CountBar.create_multi([
+            {'name': 'd', 'xixi': 'd', 'age': 2},
+            {'name': 'e', 'xixi': 'e', 'age': 2},
+        ])
+        with patched_execute as execute:
+            self.assertEqual(CountBar.cache.count_by(age=2), 3)
+            self.assertFalse(execute.called)
+        cache_client = CountBar._options.cache_client
+        with patch.object(cache_client, 'incr', side_effect=Exception):
+            CountBar.create(name='f', xixi='f', age=2)
+        with patched_execute as execute:
+            self.assertEqual(CountBar.cache.count_by(age=2), 4)
+            self.assertTrue(execute.called)
+        self.assertEqual(Bar.cache.count_by(age=2), 4)
+
+    def test_patch_ids(self):
+        class PatchBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_patch_ids = True
+
+        cache_client = PatchBar._options.cache_client
+
+        def get_ids(order_by=None, **kwargs):
+            return cache_client.get(PatchBar._gen_cache_key(
+                _olo_suffix='ids', order_by=order_by, **kwargs
+            ))
+
+        a = PatchBar.create(name='a', xixi='b', age=1)
+        b = PatchBar.create(name='b', xixi='d', age=1)
+        self.assertEqual(
+            [x.name for x in PatchBar.cache.gets_by(
+                age=1, order_by=PatchBar.xixi
+            )],
+            ['a', 'b']
+        )
+        PatchBar.cache.gets_by(age=1)
+        c = PatchBar.create(name='c', xixi='c', age=1)
+        self.assertEqual(get_ids(('xixi',), age=1), ['a', 'c', 'b'])
+        self.assertEqual(get_ids(age=1), ['a', 'b', 'c'])
+        c.update(xixi='e')
+        self.assertEqual(get_ids(('xixi',), age=1), ['a', 'b', 'c'])
+        b.update(age=2)
+        self.assertEqual(get_ids(('xixi',), age=1), ['a', 'c'])
+        self.assertIsNone(get_ids(('xixi',), age=2))
+        a.delete()
+        self.assertEqual(get_ids(('xixi',), age=1), ['c'])
+        self.assertEqual(get_ids(age=1), ['c'])
+        PatchBar.cache.get('c')
+        with patched_execute as execute:
+            self.assertEqual(
+                [x.name for x in PatchBar.cache.gets_by(
+                    age=1, order_by=PatchBar.xixi
+                )],
+                ['c']
+            )
+            self.assertFalse(execute.called)
+        with patch.object(cache_client, 'cas', return_value=False):
+            PatchBar.create(name='d', xixi='a', age=1)
+        self.assertIsNone(get_ids(('xixi',), age=1))
+        self.assertEqual(
+            [x.name for x in PatchBar.cache.gets_by(
+                age=1, order_by=PatchBar.xixi
+            )],
+            ['d', 'c']
+        )
+
+    def test_cache_codec(self):
+        dummy = Dummy.create(**attrs)
+        key = Dummy._gen_cache_key(id=dummy.id)
+        cache_client = Dummy._options.cache_client
+        self.assertEqual(Dummy.cache.get(dummy.id).payload, dummy.payload)
+        value = cache_client.get(key)
+        self.assertIsInstance(value, bytes)
+        codec = Dummy._options.cache_codec
+        data = Dummy._get(dummy.id)._data
+        self.assertEqual(codec.decode(Dummy, value), data)
+        self.assertLess(len(value), len(pickle.dumps(data, -1)))
+        with patched_execute as execute:
+            _dummy = Dummy.cache.get(dummy.id)
+            self.assertFalse(execute.called)
+        self.assertEqual(_dummy._data, data)
+        self.assertEqual(_dummy.tags, dummy.tags)
+        self.assertEqual(_dummy.password, 'password')
+
+        cache_client.set(key, b'\x01' + pickle.dumps((0, (), ())))
+        with patched_execute as execute:
+            self.assertEqual(Dummy.cache.get(dummy.id).name, dummy.name)
+            self.assertTrue(execute.called)
+
+        compressed = CompactCacheCodec(compress_threshold=0)
+        value = compressed.encode(Dummy, {'id': 1, 'name': 'a' * 100})
+        self.assertEqual(value[:1], b'\x02')
+        self.assertEqual(
+            compressed.decode(Dummy, value), {'id': 1, 'name': 'a' * 100}
+        )
+        self.assertIs(compressed.encode(Dummy, missing), missing)
+
+        class DictBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_codec = DictCacheCodec()
+
+        DictBar.create(name='a', xixi='a', age=1)
+        self.assertEqual(DictBar.cache.get('a').name, 'a')
+        self.assertIsInstance(
+            cache_client.get(DictBar._gen_cache_key(name='a')), dict
+        )
+
+    def test_get_many(self):
+        dummies = [Dummy.create(name='foo', age=i) for i in range(3)]
+        bar = Bar.create(name='a', xixi='a', age=1)
+        Dummy.cache.get(dummies[0].id)
+        cache_client = Dummy._options.cache_client
+        mapping = {
+            Dummy: [d.id for d in dummies] + [1000],
+            Bar: ['a', 'b'],
+        }
+        with patch.object(
+            cache_client, 'get_multi', wraps=cache_client.get_multi
+        ) as get_multi, patch.object(
+            cache_client, 'set_multi', wraps=cache_client.set_multi
+        ) as set_multi:
+            res = get_many(mapping)
+            self.assertEqual(get_multi.call_count, 1)
+            self.assertEqual(set_multi.call_count, 1)
+        self.assertEqual(
+            [d.id for d in res[Dummy]], [d.id for d in dummies]
+        )
+        self.assertEqual([b.name for b in res[Bar]], [bar.name])
+        with patched_execute as execute:
+            res = get_many(mapping, filter_none=False, max_workers=2)
+            self.assertFalse(execute.called)
+        self.assertIsNone(res[Dummy][-1])
+        self.assertEqual(res[Bar][0].name, 'a')
+        self.assertIsNone(res[Bar][1])
+        cache_client.delete_multi([
+            Dummy._gen_cache_key(id=dummies[0].id),
+            Bar._gen_cache_key(name='a'),
+        ])
+        res = get_many(mapping, max_workers=2)
+        self.assertEqual(res[Dummy][0].id, dummies[0].id)
+        self.assertEqual(res[Bar][0].name, 'a')
+        res = get_many({Foo: [1]})
+        self.assertEqual(res, {Foo: []})
+
+    def test_coalesced_invalidation(self):
+        dummies = [Dummy.create(name='foo', age=i) for i in range(3)]
+        Dummy.cache.gets([d.id for d in dummies])
+        cache_client = Dummy._options.cache_client
+        with patch.object(
+            cache_client, 'delete_multi', wraps=cache_client.delete_multi
+        ) as delete_multi:
+            with db.transaction():
+                for dummy in dummies:
+                    dummy.update(name='bar')
+                    dummy.update(age=dummy.age + 10)
+                self.assertFalse(delete_multi.called)
+                self.assertEqual(Dummy.cache.get(dummies[0].id).name, 'bar')
+            self.assertEqual(delete_multi.call_count, 1)
+            keys = delete_multi.call_args[0][0]
+            self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(
+            [d.age for d in Dummy.cache.gets([d.id for d in dummies])],
+            [Dummy._get(d.id).age for d in dummies]
+        )
+        try:
+            with db.transaction():
+                dummies[0].update(name='baz')
+                raise AE
+        except AE:
+            pass
+        self.assertEqual(Dummy.cache.get(dummies[0].id).name, 'bar')
+        self.assertEqual(db._local._cache_keys, {})
+
+    def test_write_through(self):
+        class WriteBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_write_through = True
+
+        cache_client = WriteBar._options.cache_client
+        WriteBar.cache.get('a')
+        bar = WriteBar.create(name='a', xixi='a', age=1)
+        with patched_execute as execute:
+            self.assertEqual(WriteBar.cache.get('a').age, 1)
+            self.assertFalse(execute.called)
+        WriteBar.cache.gets_by(age=1)
+        bar.update(age=2)
+        with patched_execute as execute:
+            self.assertEqual(WriteBar.cache.get('a').age, 2)
+            self.assertFalse(execute.called)
+        self.assertIsNone(cache_client.get(
+            WriteBar._gen_cache_key(_olo_suffix='ids', age=1)
+        ))
+        with db.transaction():
+            bar.update(age=3)
+            self.assertEqual(WriteBar.cache.get('a').age, 3)
+        with patched_execute as execute:
+            self.assertEqual(WriteBar.cache.get('a').age, 3)
+            self.assertFalse(execute.called)
+        try:
+            with db.transaction():
+                bar.update(age=4)
+                raise AE
+        except AE:
+            pass
+        self.assertEqual(WriteBar.cache.get('a').age, 3)
+        bar.delete()
+        self.assertIsNone(WriteBar.cache.get('a'))
+
+    def test_gen_cache_keys(self):
+        self.assertEqual(
+            Dummy._gen_cache_key(id=1),
+            'olo:db:dummy:(id=1):v0.2.0:suffix:_olo_data'
+        )
+        self.assertEqual(
+            Dummy._gen_cache_key(id='1'), Dummy._gen_cache_key(id=1)
+        )
+        self.assertEqual(
+            Dummy._gen_cache_keys([{'id': 1}, {'id': '2'}, {'name': 'a b'}]),
+            [
+                'olo:db:dummy:(id=1):v0.2.0:suffix:_olo_data',
+                'olo:db:dummy:(id=2):v0.2.0:suffix:_olo_data',
+                "olo:db:dummy:(name='a&nbsp;b'):v0.2.0:suffix:_olo_data",
+            ]
+        )
+        self.assertEqual(
+            Bar._gen_cache_key(
+                _olo_suffix='ids', xixi='a', age=1, order_by=('-age', 'xixi')
+            ),
+            "olo:db:bar:(age=1,order_by=('-age',&nbsp;'xixi'),xixi='a')"
+            ":v0.2.0:suffix:ids"
+        )
+
+        class LongBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_key_max_length = 60
+
+        key = LongBar._gen_cache_key(
+            _olo_suffix='ids', xixi='a' * 100, age=1, order_by=('xixi',)
+        )
+        self.assertTrue(key.startswith('olo:db:bar:(md5='))
+        self.assertTrue(
+            key.endswith(",order_by=('xixi',)):v0.2.0:suffix:ids")
+        )
+        self.assertEqual(
+            LongBar._gen_cache_key(name='a'), Bar._gen_cache_key(name='a')
+        )
+
+    def test_invalidation_plan(self):
+        plan = Bar._olo_invalidation_plan
+        self.assertEqual(plan.fields, {'name', 'xixi', 'age', 'word'})
+        bar = Bar.create(name='a', xixi='a', age=1)
+        bar._set_orig()
+        bar.age = 2
+        keys = get_delete_cache_keys(bar)
+        self.assertIn(Bar._gen_cache_key(name='a'), keys)
+        self.assertIn(Bar._gen_cache_key(_olo_suffix='count', age=1), keys)
+        self.assertIn(Bar._gen_cache_key(_olo_suffix='count', age=2), keys)
+        self.assertNotIn(
+            Bar._gen_cache_key(_olo_suffix='count', xixi='a'), keys
+        )
+        self.assertIn(Bar._gen_cache_key(
+            _olo_suffix='ids', xixi='a', order_by=('-age', 'xixi')
+        ), keys)
+        self.assertNotIn(Bar._gen_cache_key(
+            _olo_suffix='ids', xixi='a', order_by=('xixi',)
+        ), keys)
+
     def test_create_cache(self):
         bar = Bar.create(name='b', xixi='a', age=1)
         with no_cache_client(Bar):
@@ -1,5 +1,8 @@
 # coding: utf-8
+from mock import patch
+
 from olo import funcs
+from olo.cache import CacheWrapper
 from olo.funcs import COUNT, SUM, AVG, MAX, DISTINCT
 from .base import TestCase, Foo, Bar, Dummy
 from .fixture import is_pg
@@ -279,6 +282,81 @@ class TestCachedQuery(TestCase):
         foos = Foo.cq.filter(age=3).limit(3).all()
         self.assertEqual(foos, [])
 
+    def test_in(self):
+        for i, (xixi, age) in enumerate(
+                [('a', 1), ('b', 2), ('c', 1), ('d', 3), ('e', 2)]
+        ):
+            Bar.create(name=str(i), xixi=xixi, age=age)
+        q = Bar.cq.filter(Bar.age.in_([1, 2, 4])).order_by('xixi')
+        with patched_execute as execute:
+            bars = q.all()
+            self.assertEqual(execute.call_count, 2)
+        self.assertEqual([b.xixi for b in bars], ['a', 'b', 'c', 'e'])
+        with patched_execute as execute:
+            bars = q.offset(1).limit(2).all()
+            self.assertFalse(execute.called)
+        self.assertEqual([b.xixi for b in bars], ['b', 'c'])
+        with patched_execute as execute:
+            bars = Bar.cq.filter(
+                Bar.age.in_([2, 1])
+            ).order_by(Bar.age.desc(), 'xixi').all()
+            self.assertEqual(execute.call_count, 1)
+        self.assertEqual([b.xixi for b in bars], ['b', 'e', 'a', 'c'])
+        bars = Bar.cq.filter(Bar.name.in_(['3', '0', '9'])).all()
+        self.assertEqual([b.name for b in bars], ['3', '0'])
+        with patched_execute as execute:
+            self.assertEqual(Bar.cq.filter(Bar.age.in_([1, 2])).count(), 4)
+            self.assertTrue(execute.called)
+        with patched_execute as execute:
+            bars = Bar.cq.filter(Bar.age.in_([1])).order_by('age').all()
+            self.assertTrue(execute.called)
+        Bar.get('0').update(age=2)
+        bars = q.all()
+        self.assertEqual([b.xixi for b in bars], ['a', 'b', 'c', 'e'])
+        self.assertEqual([b.age for b in bars], [2, 2, 1, 2])
+
+    def test_in_str_values(self):
+        Bar.create(name='0', xixi='a', age=1)
+        bars = Bar.cq.filter(Bar.age.in_(['1', '2'])).all()
+        self.assertEqual([b.name for b in bars], ['0'])
+        self.assertEqual([b.name for b in Bar.cache.gets_by(age=1)], ['0'])
+
+    def test_in_collation(self):
+        Bar.create(name='a', xixi='foo', age=1)
+        calls = []
+
+        def case_insensitive(fields, *args, **kwargs):
+            calls.append(kwargs.get('xixi'))
+            if args:
+                # the grouped query, as a case insensitive collation answers
+                return [('a', 'foo')]
+            return ['a'] if kwargs['xixi'].lower() == 'foo' else []
+
+        with patch.object(Bar, 'get_entities_by',
+                          side_effect=case_insensitive):
+            bars = Bar.cq.filter(Bar.xixi.in_(['Foo', 'bar']), age=1).all()
+        self.assertEqual([b.name for b in bars], ['a'])
+        self.assertEqual(calls, [None, 'Foo', 'bar'])
+
+        with patch.object(Bar, 'get_entities_by',
+                          side_effect=case_insensitive):
+            bars = Bar.cq.filter(Bar.xixi.in_(['FOO', 'foo']), age=1).all()
+        self.assertEqual([b.name for b in bars], ['a'])
+
+    def test_in_hot_value(self):
+        for i in range(7):
+            Bar.create(name=str(i), xixi=str(i), age=1)
+        Bar.create(name='z', xixi='z', age=2)
+        with patch.object(CacheWrapper, 'MAX_COUNT', 2):
+            bars = Bar.cq.filter(
+                Bar.age.in_([1, 2])
+            ).order_by('xixi').limit(2).all()
+            self.assertEqual([b.name for b in bars], ['0', '1'])
+            self.assertEqual(
+                [b.name for b in Bar.cache.gets_by(age=2, order_by='xixi')],
+                ['z']
+            )
+
     def test_count_by(self):
         with patched_execute as execute:
             c = Bar.cq.filter(xixi='a', age=1).count()
@@ -389,6 +467,39 @@ class TestCachedQuery(TestCase):
         rv = Dummy.cq(age).order_by(Dummy.age.in_([2, 4]).desc()).order_by(Dummy.id.desc()).all()  # noqa
         self.assertEqual(rv, [2, 4, 7, 6, 3])
 
+    def test_rows_mode(self):
+        Bar.create(name='a', xixi='a', age=1)
+        query = Bar.cq.filter(age=1)
+        self.assertEqual(query.all()[0].name, 'a')
+        self.assertIsInstance(query.tuples().all()[0], tuple)
+        self.assertEqual(query.tuples().all()[0][0], 'a')
+        self.assertEqual(query.namedtuples().all()[0].name, 'a')
+        self.assertEqual(query.dicts().all()[0]['name'], 'a')
+        self.assertEqual(query.dicts().first()['xixi'], 'a')
+
+    def test_after(self):
+        for name, xixi in zip('abcde', 'bdaec'):
+            Bar.create(name=name, xixi=xixi, age=1)
+        query = Bar.cq.filter(age=1).order_by(Bar.xixi).limit(2)
+        pages = [query.all()]
+        for _ in range(3):
+            pages.append(query.after(pages[-1][-1]).all() if pages[-1] else [])
+        self.assertEqual(
+            [[b.name for b in page] for page in pages],
+            [['c', 'a'], ['e', 'b'], ['d'], []]
+        )
+        token = Bar.query.order_by(Bar.xixi).after_token(Bar.get('e'))
+        with patched_execute as execute:
+            self.assertEqual(
+                [b.name for b in query.after(token).all()], ['b', 'd']
+            )
+            self.assertFalse(execute.called)
+        self.assertEqual(
+            [b.name for b in Bar.cq.filter(Bar.age.in_([1])).order_by(
+                Bar.xixi).after(Bar.get('b')).all()],
+            ['d']
+        )
+
     def test_group_by(self):
         Dummy.create(name='foo0', age=1)
         Dummy.create(name='foo2', age=2)
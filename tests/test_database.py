@@ -3,6 +3,7 @@
 from mock import Mock
 
 from olo import DataBase
+from olo.database import MySQLCursor
 from olo.errors import DataBaseError
 from .base import TestCase, db as store, beansdb
 from .fixture import is_pg
@@ -158,3 +159,15 @@ class TestDataBase(TestCase):
             db.commit()
         self.assertEqual(db.report.call_count, 1)
         db.report = old_report
+
+    def test_mysql_last_rowids(self):
+        cursor = MySQLCursor.__new__(MySQLCursor)
+        cursor.cur = Mock(lastrowid=11)
+        cursor.cur.fetchone.return_value = (10,)
+        self.assertEqual(cursor.get_last_rowids(3), [11, 21, 31])
+        cursor.cur.execute.assert_called_once_with(
+            'SELECT @@auto_increment_increment'
+        )
+        self.assertEqual(cursor.get_last_rowids(1), [11])
+        cursor.cur.lastrowid = 0
+        self.assertEqual(cursor.get_last_rowids(2), [])
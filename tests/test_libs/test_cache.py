@@ -0,0 +1,49 @@
+import gc
+
+from olo.libs.cache import LRUCache, WeakKeyLRUCache
+from tests.base import TestCase
+
+
+class TestLRUCache(TestCase):
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('b', 0), 0)
+        self.assertEqual(cache.get_multi(['a', 'c', 'd']), {'a': 1, 'c': 3})
+        self.assertIn('a', cache)
+        cache.delete('a')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.stats(), {
+            'size': 1,
+            'max_size': 2,
+            'hits': 3,
+            'misses': 3,
+            'evictions': 1,
+        })
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_ttl(self):
+        cache = LRUCache(2, ttl=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        cache = LRUCache(2, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_weak_key(self):
+        cache = WeakKeyLRUCache(2)
+        code = compile('1 + 1', '<test>', 'eval')
+        cache.set(code, 'ast')
+        self.assertEqual(cache.get(code), 'ast')
+        self.assertIsNone(cache.get(compile('1 + 1', '<test>', 'eval')))
+        del code
+        gc.collect()
+        self.assertEqual(len(cache), 0)
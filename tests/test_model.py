@@ -6,16 +6,16 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from mock import patch, Mock
 
-from olo import Field, DbField, Model
+from olo import Field, DbField, Model, identity_scope
 from olo.key import StrKey
 from olo.libs.aes import encrypt
 from olo.utils import transform_type, missing, override
 from olo.errors import (
-    ValidationError, ParseError, InvalidFieldError
+    ValidationError, ParseError, InvalidFieldError, SupportError
 )
 from olo.migration import MigrationVersion
 from olo.compat import PY2, str_types, xrange, to_str
-from .base import db, TestCase, BaseModel, Dummy, Bar, db, Ttt, Foo, Lala
+from .base import db, mc, TestCase, BaseModel, Dummy, Bar, db, Ttt, Foo, Lala, Gender
 from .utils import auto_use_cache_ctx, patched_execute
 
 
@@ -30,6 +30,24 @@ attrs = dict(
 )
 
 
+class CompactFoo(Model):
+    __table_name__ = 'foo'
+
+    id = Field(int, primary_key=True, auto_increment=True)
+    name = Field(str, noneable=True, default='foo')
+    age = Field(int, noneable=True, default=1)
+    age_str = Field(int, noneable=True, default=1)
+    key = Field(str, noneable=True, default='key')
+    boolean = Field(bool, default=False)
+    test_getter = Field(int, default=0)
+    test_setter = Field(int, default=0)
+
+    class Options:
+        db = db
+        cache_client = mc
+        compact = True
+
+
 class _Dummy(Dummy):
     class Options:
         foo = 'bar'
@@ -110,6 +128,57 @@ class TestModel(TestCase):
         finally:
             Dummy.after_create = old_after_create
 
+    def test_create_multi(self):
+        with patched_execute as execute:
+            dummies = Dummy.create_multi(
+                [dict(attrs, name='foo%s' % i) for i in xrange(5)] +
+                [dict(attrs, id=233, prop1=[1])],
+                batch_size=2
+            )
+            # 4 batches (3 auto increment + 1 explicit id),
+            # each one INSERT + one SELECT for the missing fields
+            self.assertEqual(execute.call_count, 8)
+        self.assertEqual([d.id for d in dummies], [1, 2, 3, 4, 5, 233])
+        self.assertEqual(dummies[0].name, 'foo0')
+        self.assertEqual(dummies[0].dynasty, '现代')
+        self.assertEqual(dummies[-1].prop1, ['1'])
+        self.assertFalse(dummies[0]._olo_is_new)
+        self.assertIsNone(dummies[0].foo)
+        dummy = Dummy.get(4)
+        self.assertEqual(dummy.name, 'foo3')
+        self.assertEqual(dummy.password, 'password')
+        self.assertEqual(Dummy.get(233).prop1, ['1'])
+        self.assertEqual(Dummy.create_multi([]), [])
+        with self.assertRaises(ParseError):
+            Dummy.create_multi([dict(attrs), dict(attrs, age='a')])
+        self.assertEqual(Dummy.query.count(), 6)
+        bc = Dummy.before_create
+        try:
+            Dummy.before_create = classmethod(lambda cls, **kwargs: kwargs['name'] != 'skip')
+            dummies = Dummy.create_multi([dict(name='skip'), dict(name='ok')])
+        finally:
+            Dummy.before_create = bc
+        self.assertEqual([d.name for d in dummies], ['ok'])
+        self.assertEqual(Dummy.query.count(), 7)
+        try:
+            with db.transaction():
+                Dummy.create_multi([dict(name='a'), dict(name='b')])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(Dummy.query.count(), 7)
+        before_insert = Dummy._olo_before_insert
+        with patch.object(
+            Dummy, '_olo_before_insert', autospec=True,
+            side_effect=lambda inst: (
+                ({}, {}) if inst.name == 'empty' else before_insert(inst)
+            )
+        ), patch('olo.model.after_insert_multi') as signal:
+            with self.assertRaises(SupportError):
+                Dummy.create_multi([dict(name='c'), dict(name='empty')])
+        self.assertFalse(signal.send.called)
+        self.assertEqual(Dummy.query.count(), 7)
+
     def test_save(self):
         dummy = Dummy(**attrs)
         self.assertEqual(dummy.name, attrs['name'])
@@ -304,6 +373,69 @@ class TestModel(TestCase):
         dummy = Dummy.get(dummy.id)
         self.assertEqual(dummy.prop1, ['1', '2', '3'])
 
+    def test_update_multi(self):
+        dummies = Dummy.create_multi([
+            dict(attrs, name='foo0', age=1),
+            dict(attrs, name='foo1', age=2),
+            dict(attrs, name='foo2', age=3),
+        ])
+        ids = [d.id for d in dummies]
+        name_did_update = Mock()
+        Dummy.name_did_update = name_did_update
+        try:
+            with patched_execute as execute:
+                updated = Dummy.update_multi({
+                    ids[0]: dict(name='bar0', flag=1),
+                    ids[1]: dict(name='bar1', flag=2, gender=Gender.MALE),
+                    ids[2]: dict(name='bar2', flag=1),
+                    233: dict(name='xixi'),
+                }, batch_size=1)
+                # 1 SELECT for gets + 3 UPDATE + 3 SELECT for dynamic age
+                self.assertEqual(execute.call_count, 7)
+        finally:
+            del Dummy.name_did_update
+        self.assertEqual(name_did_update.call_count, 3)
+        self.assertEqual([d.id for d in updated], ids)
+        self.assertEqual([d.name for d in updated], ['bar0', 'bar1', 'bar2'])
+        self.assertEqual([d.age for d in updated], [2, 3, 4])
+        self.assertEqual([d.count for d in updated], [3, 3, 3])
+        self.assertIsNone(updated[0]._orig)
+        dummies = Dummy.gets(ids)
+        self.assertEqual([d.name for d in dummies], ['bar0', 'bar1', 'bar2'])
+        self.assertEqual([d.flag for d in dummies], [1, 2, 1])
+        self.assertEqual([d.age for d in dummies], [2, 3, 4])
+        self.assertEqual([d.gender for d in dummies],
+                         [Gender.FEMALE, Gender.MALE, Gender.FEMALE])
+        self.assertEqual([d.count for d in dummies], [3, 3, 3])
+        self.assertEqual(Dummy.update_multi({}), [])
+        with patch.object(Dummy, 'get_multi', wraps=Dummy.get_multi) as get_multi:
+            Dummy.update_multi({ids[0]: dict(flag=0)})
+        get_multi.assert_called_once_with([ids[0]], filter_none=False)
+        with self.assertRaises(ParseError):
+            Dummy.update_multi({ids[0]: dict(age='a')})
+        bu = Dummy.before_update
+        try:
+            Dummy.before_update = lambda _self, **kwargs: _self.id != ids[0]
+            updated = Dummy.update_multi({
+                ids[0]: dict(name='foo0'),
+                ids[1]: dict(name='foo1', prop1=[1]),
+            })
+        finally:
+            Dummy.before_update = bu
+        self.assertEqual([d.id for d in updated], [ids[1]])
+        self.assertEqual(Dummy.get(ids[0]).name, 'bar0')
+        self.assertEqual(Dummy.get(ids[1]).name, 'foo1')
+        self.assertEqual(Dummy.get(ids[1]).prop1, ['1'])
+        try:
+            with db.transaction():
+                updated = Dummy.update_multi({ids[2]: dict(name='foo2')})
+                self.assertEqual(updated[0].name, 'foo2')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(updated[0].name, 'bar2')
+        self.assertEqual(Dummy.get(ids[2]).name, 'bar2')
+
     def test_delete(self):
         dummy = Dummy.create(**attrs)
         dummy1 = Dummy.create(**attrs)
@@ -862,6 +994,116 @@ class TestModel(TestCase):
         foo = _Foo('xixi')
         self.assertEqual(foo.name, 'xixi')
 
+    def test_row_constructor(self):
+        names = tuple(Dummy.__sorted_fields__)
+        constructor = Dummy._olo_get_row_constructor(names, 1)
+        self.assertIs(Dummy._olo_get_row_constructor(names, 1), constructor)
+        self.assertIsNot(Dummy._olo_get_row_constructor(names), constructor)
+        dummy = Dummy.create(**attrs)
+        row = (None,) + tuple(dummy._data[k] for k in names)
+        row = row[:4] + (encrypt(row[4], Dummy.AES_KEY),) + row[5:]
+        inst = constructor(row)
+        self.assertEqual(inst, dummy)
+        self.assertFalse(inst._olo_is_new)
+        self.assertEqual(inst.password, 'password')
+        self.assertEqual(inst._data, {k: dummy._data[k] for k in names})
+        inst.name = 'bar'
+        self.assertTrue(inst.is_dirty())
+        inst = Dummy._olo_load(dummy._data)
+        self.assertEqual(inst.password, 'password')
+        self.assertIsNot(inst._data, dummy._data)
+
+        class _Foo(Foo):
+            @override
+            def __init__(self, **attrs):
+                super(_Foo, self).__init__(**attrs)
+                self.inited = True
+
+        foo = _Foo._olo_get_row_constructor(('id', 'name'))((1, 'foo'))
+        self.assertTrue(foo.inited)
+        self.assertTrue(_Foo._olo_load({'id': 1, 'name': 'foo'}).inited)
+
+        class _Bar(Foo):
+            @classmethod
+            def _instantiate(cls, **attrs):
+                inst = cls(**attrs)
+                inst.instantiated = True
+                return inst
+
+        bar = _Bar._olo_get_row_constructor(('id', 'name'))((1, 'bar'))
+        self.assertTrue(bar.instantiated)
+        self.assertFalse(bar._olo_is_new)
+        self.assertTrue(_Bar._olo_load({'id': 1, 'name': 'bar'}).instantiated)
+
+    def test_identity_scope(self):
+        a = Dummy.create(name='a', age=1)
+        b = Dummy.create(name='b', age=2)
+        with identity_scope() as identity_map:
+            _a = Dummy.get(a.id)
+            self.assertIsNot(_a, a)
+            with patched_execute as execute:
+                self.assertIs(Dummy.get(a.id), _a)
+                self.assertFalse(execute.called)
+            self.assertIs(Dummy.query.filter(id=a.id).first(), _a)
+            with patched_execute as execute:
+                res = Dummy.gets([a.id, b.id, 1000], filter_none=False)
+                self.assertEqual(execute.call_count, 1)
+            self.assertIs(res[0], _a)
+            self.assertEqual(res[1].name, 'b')
+            self.assertIsNone(res[2])
+            with auto_use_cache_ctx(Dummy):
+                with patched_execute as execute:
+                    self.assertIs(Dummy.get(b.id), res[1])
+                    self.assertEqual(
+                        Dummy.cache.gets([b.id, a.id]), [res[1], _a]
+                    )
+                    self.assertFalse(execute.called)
+            with identity_scope() as nested_map:
+                self.assertIs(nested_map, identity_map)
+            _a.update(name='aa')
+            self.assertIs(Dummy.get(a.id), _a)
+            a.update(name='aaa')
+            self.assertEqual(Dummy.get(a.id).name, 'aaa')
+            res[1].delete()
+            self.assertIsNone(Dummy.get(b.id))
+        self.assertIsNot(Dummy.get(a.id), Dummy.get(a.id))
+
+        class SubDummy(Dummy):
+            __table_name__ = 'dummy'
+
+        with identity_scope():
+            dummy = Dummy.get(a.id)
+            sub = SubDummy.get(a.id)
+            self.assertIsInstance(sub, SubDummy)
+            self.assertIsNot(sub, dummy)
+            self.assertIs(SubDummy.gets([a.id])[0], sub)
+            self.assertIs(Dummy.query.filter(id=a.id).first(), dummy)
+
+    def test_compact(self):
+        self.assertTrue(CompactFoo._options.compact)
+        self.assertFalse(Foo._olo_compact)
+        foo = CompactFoo.create(name='a', age=2)
+        self.assertFalse(hasattr(foo, '__dict__'))
+        with self.assertRaises(AttributeError):
+            foo.bar = 1
+        self.assertIsNone(foo._olo_dirty_fields)
+        foo.age = 3
+        self.assertTrue(foo.is_dirty())
+        foo.save()
+        self.assertFalse(foo.is_dirty())
+        foo = CompactFoo.get(foo.id)
+        self.assertFalse(hasattr(foo, '__dict__'))
+        self.assertEqual(foo.age, 3)
+        self.assertEqual(CompactFoo.cache.get(foo.id).age, 3)
+        self.assertEqual(CompactFoo.cache.get(foo.id).name, 'a')
+        _foo = pickle.loads(pickle.dumps(foo, -1))
+        self.assertEqual(_foo.id, foo.id)
+        self.assertEqual(_foo.age, 3)
+        self.assertFalse(_foo._olo_is_new)
+        foos = CompactFoo.query.filter(id=foo.id).all()
+        self.assertEqual(foos[0].age, 3)
+        self.assertIs(foos[0]._olo_qs.entities[0], foos[0])
+
     def test_db_field_model(self):
         class Test(BaseModel):
             name = DbField(str)
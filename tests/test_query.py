@@ -2,11 +2,11 @@ import json
 from datetime import datetime
 
 from olo import funcs
-from olo.errors import ExpressionError, SupportError
+from olo.errors import ExpressionError, OrderByError, SupportError
 from olo.funcs import AVG, COUNT, DISTINCT, SUM
 from olo.utils import missing
 
-from .base import Dummy, Foo, TestCase
+from .base import db, Dummy, Foo, Gender, TestCase
 from .fixture import is_pg
 
 attrs = dict(
@@ -177,6 +177,127 @@ class TestQuery(TestCase):
             l.append(age)
         self.assertEqual(l, [4, 3, 2, 1])
 
+    def test_rows(self):
+        Dummy.create(name='foo', age=1, password='pwd', payload={'a': [1]})
+        Dummy.create(name='bar', age=2, password=None)
+        query = Dummy.query('id', 'name', Dummy.age.alias('a'), 'password',
+                            'payload', 'gender').order_by('id')
+        rows = query.tuples().all()
+        self.assertEqual(rows, [
+            (1, 'foo', 1, 'pwd', {'a': [1]}, Gender.FEMALE),
+            (2, 'bar', 2, None, {}, Gender.FEMALE),
+        ])
+        rows = query.namedtuples().all()
+        self.assertEqual(rows[0].name, 'foo')
+        self.assertEqual(rows[0].a, 1)
+        self.assertEqual(rows[0].password, 'pwd')
+        self.assertEqual(rows[1].gender, Gender.FEMALE)
+        rows = query.dicts().all()
+        self.assertEqual(rows[1], {
+            'id': 2, 'name': 'bar', 'a': 2, 'password': None,
+            'payload': {}, 'gender': Gender.FEMALE
+        })
+        row = Dummy.query.order_by('id').dicts().first()
+        self.assertEqual(row['name'], 'foo')
+        self.assertEqual(row['tags'], [])
+        self.assertIsInstance(row['created_at'], datetime)
+        row = Dummy.query(Dummy, Foo).join(Foo).on(Dummy.id == Foo.id).namedtuples().first()
+        self.assertIsNone(row)
+        self.assertEqual(
+            Dummy.query('age', COUNT(1).alias('c')).order_by('age').dicts().all(),
+            [{'age': 1, 'c': 1}, {'age': 2, 'c': 1}]
+        )
+        self.assertEqual(
+            Dummy.query('name', raw=True).order_by('id').tuples().all(),
+            [('foo',), ('bar',)]
+        )
+        self.assertEqual(
+            list(query.filter(id=1).namedtuples().stream())[0].name,
+            'foo'
+        )
+
+    def test_stream(self):
+        def busy_size():
+            return db.pool._overflow + db.pool.size - db.pool.idle_size
+
+        self.assertEqual(list(Dummy.query.stream()), [])
+        for i in range(5):
+            Dummy.create(name='foo{}'.format(i), age=i, prop1=[str(i)])
+        dummys = list(Dummy.query.order_by(Dummy.id).stream(batch_size=2))
+        self.assertEqual([d.name for d in dummys], ['foo0', 'foo1', 'foo2', 'foo3', 'foo4'])
+        self.assertEqual([len(d._olo_qs.entities) for d in dummys], [2, 2, 2, 2, 1])
+        self.assertIs(dummys[0]._olo_qs, dummys[1]._olo_qs)
+        self.assertIsNot(dummys[1]._olo_qs, dummys[2]._olo_qs)
+        self.assertEqual([d.prop1 for d in dummys], [[str(i)] for i in range(5)])
+        ages = list(Dummy.query('age').filter(Dummy.age > 1).order_by(Dummy.age.desc()).stream(batch_size=2))
+        self.assertEqual(ages, [4, 3, 2])
+        self.assertEqual(list(Dummy.query(DISTINCT(Dummy.name)).stream(batch_size=1)).count('foo0'), 1)
+        it = Dummy.query.stream(batch_size=1)
+        self.assertEqual(next(it).name, 'foo0')
+        self.assertEqual(busy_size(), 1)
+        it.close()
+        self.assertEqual(busy_size(), 0)
+        it = Dummy.query.stream(batch_size=1)
+        self.assertEqual(busy_size(), 1)
+        del it
+        self.assertEqual(busy_size(), 0)
+        with self.assertRaises(Exception):
+            list(Dummy.query.filter('foo = bar').stream())
+        self.assertEqual(Dummy.query.count(), 5)
+        self.assertEqual(busy_size(), 0)
+
+    def test_after(self):
+        for i, age in enumerate([3, 1, 3, 2, 3, 1]):
+            Dummy.create(name='foo{}'.format(i), age=age)
+        query = Dummy.query.order_by(Dummy.age.desc(), 'name')
+        self.assertEqual(
+            [d.id for d in query.after(None).all()],
+            [1, 3, 5, 4, 2, 6]
+        )
+        pages = []
+        token = None
+        while True:
+            page = query.after(token).limit(2).all()
+            if not page:
+                break
+            pages.append([d.id for d in page])
+            token = query.after_token(page[-1])
+        self.assertEqual(pages, [[1, 3], [5, 4], [2, 6]])
+        self.assertEqual(
+            [d.id for d in query.after(Dummy.get(5)).limit(2)],
+            [4, 2]
+        )
+        self.assertEqual(
+            [d.id for d in query.after((3, 'foo4', 5))],
+            [4, 2, 6]
+        )
+        self.assertEqual(
+            [d.id for d in query.filter(Dummy.id < 6).after((2, 'foo3', 4))],
+            [2]
+        )
+        self.assertEqual(
+            [d.id for d in Dummy.query.after(Dummy.get(4)).limit(1)],
+            [5]
+        )
+        self.assertEqual(
+            [d.id for d in Dummy.query.order_by(Dummy.created_at).after(
+                Dummy.query.order_by(Dummy.created_at).after_token(Dummy.get(4))
+            ).limit(1)],
+            [5]
+        )
+        self.assertEqual(
+            Dummy.get_multi_by(Dummy.age > 1, order_by=Dummy.age.desc(), after=Dummy.get(3)),
+            [Dummy.get(5), Dummy.get(4)]
+        )
+        self.assertRaises(ExpressionError, lambda: query.after('xxx').all())
+        self.assertRaises(ExpressionError, lambda: query.after((3, 'foo')).all())
+        self.assertRaises(ExpressionError, lambda: query.after((None, 'foo', 1)).all())
+        self.assertRaises(ExpressionError, lambda: query.after(object()).all())
+        self.assertRaises(
+            OrderByError,
+            lambda: Dummy.query.order_by((Dummy.age + 1).desc()).after(None).all()
+        )
+
     def test_update(self):
         Dummy.create(name='foo0', age=3)
         Dummy.create(name='foo1', age=2)
@@ -0,0 +1,186 @@
+from olo.sharded_cache import ShardedCacheClient
+from .base import TestCase, Bar
+from .utils import patched_execute
+
+
+class DictClient(object):
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+        self.failing = False
+
+    def _check(self, method):
+        self.calls.append(method)
+        if self.failing:
+            raise IOError('node is down')
+
+    def get(self, key):
+        self._check('get')
+        return self.data.get(key)
+
+    def get_multi(self, keys):
+        self._check('get_multi')
+        return {k: self.data[k] for k in keys if k in self.data}
+
+    def gets(self, key):
+        self._check('gets')
+        if key not in self.data:
+            return None
+        return self.data[key], repr(self.data[key])
+
+    def cas(self, key, val, time=0, cas_unique=None):
+        self._check('cas')
+        if key not in self.data or repr(self.data[key]) != cas_unique:
+            return False
+        self.data[key] = val
+        return True
+
+    def add(self, key, val, time=0):
+        self._check('add')
+        if key in self.data:
+            return False
+        self.data[key] = val
+        return True
+
+    def incr(self, key, delta=1):
+        self._check('incr')
+        if key not in self.data:
+            return None
+        self.data[key] += delta
+        return self.data[key]
+
+    def decr(self, key, delta=1):
+        self._check('decr')
+        if key not in self.data:
+            return None
+        self.data[key] = max(self.data[key] - delta, 0)
+        return self.data[key]
+
+    def set(self, key, val, time=0):
+        self._check('set')
+        self.data[key] = val
+        return True
+
+    def set_multi(self, values, time=0):
+        self._check('set_multi')
+        self.data.update(values)
+        return True
+
+    def delete(self, key):
+        self._check('delete')
+        self.data.pop(key, None)
+        return True
+
+    def delete_multi(self, keys):
+        self._check('delete_multi')
+        for key in keys:
+            self.data.pop(key, None)
+        return True
+
+    def flush_all(self):
+        self._check('flush_all')
+        self.data.clear()
+        return True
+
+
+class TestShardedCacheClient(TestCase):
+    def test_sharding(self):
+        nodes = {name: DictClient() for name in 'abc'}
+        client = ShardedCacheClient(nodes)
+        keys = ['key:{}'.format(i) for i in range(300)]
+        client.set_multi({k: k for k in keys})
+        for name, node in nodes.items():
+            self.assertTrue(node.data)
+            self.assertEqual(node.calls, ['set_multi'])
+            for key in node.data:
+                self.assertEqual(client.get_node(key), name)
+        self.assertEqual(client.get_multi(keys), {k: k for k in keys})
+        self.assertEqual(client.get(keys[0]), keys[0])
+
+        smaller = ShardedCacheClient({'a': nodes['a'], 'b': nodes['b']})
+        for key in keys:
+            if client.get_node(key) != 'c':
+                self.assertEqual(smaller.get_node(key), client.get_node(key))
+
+        nodes['c'].failing = True
+        res = client.get_multi(keys)
+        self.assertEqual(
+            set(res), {k for k in keys if client.get_node(k) != 'c'}
+        )
+        calls = len(nodes['c'].calls)
+        client.get_multi(keys)
+        self.assertEqual(len(nodes['c'].calls), calls)
+        self.assertFalse(client.delete_multi(keys))
+        stats = {s['node']: s for s in client.stats.snapshot()}
+        self.assertEqual(stats['c']['errors'], 1)
+        self.assertEqual(stats['a']['errors'], 0)
+        self.assertEqual(stats['a']['calls'], len(nodes['a'].calls))
+        client.close()
+
+    def test_dead_node_invalidation(self):
+        nodes = {name: DictClient() for name in 'ab'}
+        client = ShardedCacheClient(nodes, dead_retry=0, max_pending=3)
+        keys = [k for k in ('key:{}'.format(i) for i in range(100))
+                if client.get_node(k) == 'a']
+        client.set_multi({k: k for k in keys})
+        nodes['a'].failing = True
+        self.assertFalse(client.delete(keys[0]))
+        client._dead_until['a'] = float('inf')
+        self.assertFalse(client.set(keys[1], 'new'))
+        self.assertEqual(client._pending['a'], set(keys[:2]))
+        nodes['a'].failing = False
+        self.assertIsNone(client.get(keys[0]))
+        client._dead_until['a'] = 0
+        self.assertIsNone(client.get(keys[0]))
+        self.assertEqual(nodes['a'].calls[-2:], ['delete_multi', 'get'])
+        self.assertEqual(client.get_multi(keys[:3]), {keys[2]: keys[2]})
+        self.assertFalse(client._pending)
+
+        client._dead_until['a'] = float('inf')
+        client.delete_multi(keys[:4])
+        client._dead_until['a'] = 0
+        self.assertEqual(client.get_multi(keys), {})
+        self.assertIn('flush_all', nodes['a'].calls)
+        client.close()
+
+    def test_model(self):
+        class ShardBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_client = ShardedCacheClient([DictClient(), DictClient()])
+
+        for name in 'abcd':
+            ShardBar.create(name=name, xixi=name, age=1)
+        ShardBar.cache.gets(list('abcd'))
+        with patched_execute as execute:
+            self.assertEqual(
+                [b.name for b in ShardBar.cache.gets(list('abcd'))],
+                list('abcd')
+            )
+            self.assertFalse(execute.called)
+        ShardBar.cache.get('a').update(age=2)
+        self.assertEqual(ShardBar.cache.get('a').age, 2)
+        ShardBar._options.cache_client.close()
+
+    def test_model_dead_node(self):
+        node = DictClient()
+
+        class DeadBar(Bar):
+            __table_name__ = 'bar'
+
+            class Options:
+                cache_client = ShardedCacheClient({'a': node})
+                cache_patch_ids = True
+
+        client = DeadBar._options.cache_client
+        DeadBar.create(name='a', xixi='a', age=1)
+        self.assertEqual([b.name for b in DeadBar.cache.gets_by(age=1)], ['a'])
+        client._dead_until['a'] = float('inf')
+        DeadBar.create(name='b', xixi='b', age=1)
+        client._dead_until['a'] = 0
+        self.assertEqual(
+            [b.name for b in DeadBar.cache.gets_by(age=1)], ['a', 'b']
+        )
+        self.assertNotIn('a', client._dead_until)
+        client.close()
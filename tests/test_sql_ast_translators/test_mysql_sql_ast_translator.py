@@ -1,4 +1,5 @@
 from olo.sql_ast_translators.mysql_sql_ast_translator import MySQLSQLASTTranslator  # noqa
+from olo.sql_ast_translators.postgresql_sql_ast_translator import PostgresSQLSQLASTTranslator  # noqa
 from tests.base import TestCase
 
 tran = MySQLSQLASTTranslator()
@@ -117,3 +118,61 @@ class TestMySQLSQLASTTranslator(TestCase):
                 [2]
             )
         )
+
+    def test_statement_cache(self):
+        _tran = MySQLSQLASTTranslator(statement_cache_size=2)
+
+        def make_ast(age, limit):
+            return [
+                'SELECT',
+                ['SERIES',
+                 ['COLUMN', 'foo', 'age']],
+                ['FROM',
+                 ['TABLE', 'foo']],
+                ['WHERE',
+                 ['BINARY_OPERATE',
+                  'IN',
+                  ['COLUMN', 'foo', 'age'],
+                  ['VALUE', age]]],
+                ['LIMIT', None, ['VALUE', limit]]
+            ]
+
+        sql = 'SELECT `f`.`age` FROM `foo` AS f WHERE `f`.`age` IN %s LIMIT %s'
+        self.assertEqual(_tran.translate(make_ast((1, 2), 10)), (sql, [(1, 2), 10]))
+        self.assertEqual(_tran.translate(make_ast((3,), 20)), (sql, [(3,), 20]))
+        stats = _tran.statement_cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(
+            _tran.translate(['QUOTE', 'VALUE']),
+            ('`VALUE`', [])
+        )
+        self.assertEqual(
+            _tran.translate(['BRACKET', ['VALUE', 1]]),
+            ('(%s)', [1])
+        )
+        stats = _tran.statement_cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(_tran.translate(make_ast((4,), 30)), (sql, [(4,), 30]))
+        self.assertEqual(_tran.statement_cache.stats()['misses'], 4)
+
+        _tran = MySQLSQLASTTranslator(statement_cache_size=0)
+        self.assertIsNone(_tran.statement_cache)
+        self.assertEqual(_tran.translate(make_ast((1,), 1)), (sql, [(1,), 1]))
+
+    def test_statement_cache_params_order(self):
+        _tran = PostgresSQLSQLASTTranslator()
+        for offset, limit in ((20, 10), (40, 5)):
+            self.assertEqual(
+                _tran.translate([
+                    'SELECT',
+                    ['SERIES',
+                     ['COLUMN', 'foo', 'age']],
+                    ['FROM',
+                     ['TABLE', 'foo']],
+                    ['LIMIT', ['VALUE', offset], ['VALUE', limit]]
+                ]),
+                ('SELECT "f"."age" FROM "foo" AS f LIMIT %s OFFSET %s', [limit, offset])
+            )
+        self.assertEqual(_tran.statement_cache.stats()['hits'], 1)
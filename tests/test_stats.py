@@ -0,0 +1,59 @@
+from olo.stats import StatementStats, fingerprint
+from .base import TestCase, Dummy, db
+
+
+class TestStatementStats(TestCase):
+    def tearDown(self):
+        db.statement_stats = None
+        super(TestStatementStats, self).tearDown()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM `t1`  WHERE id = 12 AND name = 'a''b'"),
+            'SELECT * FROM `t1` WHERE id = ? AND name = ?'
+        )
+        self.assertEqual(
+            fingerprint('SELECT a FROM t WHERE id IN (1, 2, 3) LIMIT %s'),
+            fingerprint('SELECT a FROM t WHERE id IN (4,5) LIMIT 10')
+        )
+
+    def test_record(self):
+        exported = []
+        stats = StatementStats(
+            exporter=exported.append, export_interval=0
+        )
+        db.statement_stats = stats
+        for i in range(3):
+            Dummy.create(name='foo', age=i)
+        Dummy.query.filter(Dummy.age > 0).all()
+        Dummy.query.filter(Dummy.age > 1).all()
+        snapshot = stats.snapshot()
+        self.assertTrue(exported)
+        self.assertEqual(exported[-1], snapshot)
+        selects = [
+            s for s in snapshot
+            if s['fingerprint'].startswith('SELECT') and
+            'Dummy.Query.all' in s['origins']
+        ]
+        self.assertEqual(len(selects), 1)
+        select = selects[0]
+        self.assertEqual(select['calls'], 2)
+        self.assertEqual(select['rows'], 3)
+        self.assertLessEqual(select['min_time'], select['p50'])
+        self.assertLessEqual(select['p99'], select['max_time'])
+        inserts = [
+            s for s in snapshot if s['fingerprint'].startswith('INSERT')
+        ]
+        self.assertEqual(inserts[0]['calls'], 3)
+        self.assertEqual(inserts[0]['origins'], {'Dummy.create': 3})
+
+        stats.reset()
+        self.assertEqual(stats.snapshot(), [])
+
+        stats = StatementStats(max_statements=1, track_origin=False)
+        db.statement_stats = stats
+        Dummy.query.filter(Dummy.age > 0).all()
+        Dummy.query.filter(Dummy.age > 0).count()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats.dropped, 1)
+        self.assertEqual(stats.snapshot()[0]['origins'], {})